@@ -0,0 +1,73 @@
+"""
+Compares the old pydub accumulation path against the NumPy streaming mixer on a synthetic mix.
+
+    python -m benchmarks.bench_crossfade --hours 2 --track-minutes 4
+"""
+import argparse
+import time
+import numpy as np
+from pydub import AudioSegment
+from src.audio.mixer import StreamingMixer, SAMPLE_RATE, CHANNELS
+
+class NullSink:
+    """
+    Discards PCM so the benchmark measures mixing work only
+    """
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+
+    def close(self):
+        pass
+
+def synthetic_tracks(hours, track_minutes, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = int(track_minutes * 60 * SAMPLE_RATE)
+    for _ in range(int(hours * 60 / track_minutes)):
+        samples = (rng.standard_normal((frames, CHANNELS)) * 3000).astype(np.int16)
+        yield AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=SAMPLE_RATE, channels=CHANNELS)
+
+def run_pydub(tracks, fade_duration, crossfade_duration):
+    combined = AudioSegment.empty()
+    for audio in tracks:
+        audio = audio.apply_gain(-3)
+        if crossfade_duration:
+            combined = combined.append(audio, crossfade=min(crossfade_duration, len(combined)))
+        else:
+            combined += audio.fade_in(fade_duration).fade_out(fade_duration)
+    return len(combined)
+
+def run_numpy(tracks, fade_duration, crossfade_duration):
+    mixer = StreamingMixer(NullSink(), fade_duration, crossfade_duration=crossfade_duration)
+    for audio in tracks:
+        mixer.add(audio, -3)
+    mixer.close()
+    return mixer.position
+
+def measure(label, func, *args):
+    wall, cpu = time.perf_counter(), time.process_time()
+    length_ms = func(*args)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(f"{label:<8} wall {wall:8.2f}s  cpu {cpu:8.2f}s  output {length_ms/1000/60:.1f} min")
+    return cpu
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=2)
+    parser.add_argument("--track-minutes", type=float, default=4)
+    parser.add_argument("--fade", type=int, default=2000)
+    parser.add_argument("--crossfade", type=int, default=4000)
+    args = parser.parse_args()
+
+    # Decoding is excluded on both sides: the tracks are materialized up front and reused
+    tracks = list(synthetic_tracks(args.hours, args.track_minutes))
+    print(f"{len(tracks)} tracks, {args.hours:g}h total, crossfade {args.crossfade} ms")
+
+    pydub_cpu = measure("pydub", run_pydub, tracks, args.fade, args.crossfade)
+    numpy_cpu = measure("numpy", run_numpy, tracks, args.fade, args.crossfade)
+    print(f"CPU time reduction: {pydub_cpu / max(numpy_cpu, 1e-9):.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Runs main.main end to end against local fake Suno, OpenAI, Anthropic and YouTube services (see fake_services.py)
+at several scales, and reports wall time, CPU time, peak memory and the per-stage breakdown from metrics.json.
+Each scale runs in a fresh process and working folder, so the song library and analysis cache start cold
+and memory figures don't carry over. Needs ffmpeg and openssl on PATH for the fixtures.
+
+    python -m benchmarks.bench_pipeline --scales small medium hour --suno-latency 5 --output results.jsonl
+    python -m benchmarks.bench_pipeline --scales medium --command render --profile render
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# tracks is the number of prompts; Suno returns two variations per prompt
+SCALES = {
+    'small': {'tracks': 5, 'target_duration': None},
+    'medium': {'tracks': 15, 'target_duration': None},
+    'large': {'tracks': 60, 'target_duration': None},
+    'hour': {'tracks': 15, 'target_duration': 3600},
+    'three-hours': {'tracks': 40, 'target_duration': 10800}
+}
+
+def install_config(http_url):
+    """
+    Registers src.config built from config-example.py with every endpoint pointed at the fake services
+    """
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("src.config", os.path.join(REPO_ROOT, "src", "config-example.py"))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    config.BASE_URL = http_url
+    config.ANTHROPIC_API_KEY = "benchmark"
+    config.OPENAI_API_KEY = "benchmark"
+    sys.modules["src.config"] = config
+
+def run_child(config):
+    """
+    Runs one scale inside this process; the parent process serves the fake endpoints
+    """
+    sys.path.insert(0, REPO_ROOT)
+    os.environ['HTTPLIB2_CA_CERTS'] = config['cert_path']
+    os.environ['ANTHROPIC_BASE_URL'] = config['http_url']
+    install_config(config['http_url'])
+
+    import main
+    from google.oauth2.credentials import Credentials
+    from src.image import generator as image_generator
+    from src.youtube import uploader
+
+    image_generator.OPENAI_IMAGES_URL = f"{config['http_url']}/v1/images/generations"
+    uploader._uploaders[None] = uploader.YouTubeUploader(
+        credentials=Credentials(token="benchmark"), api_endpoint=f"{config['https_url']}/"
+    )
+
+    os.chdir(config['workdir'])
+    started = time.perf_counter()
+    asyncio.run(main.main(
+        concurrent_limit=config['suno_concurrency'], target_duration=config['target_duration'],
+        command=config['command'], profile=config['profile'], tracks=config['tracks']
+    ))
+    wall = time.perf_counter() - started
+
+    run_folder = os.path.join("Output", sorted(name for name in os.listdir("Output") if not name.startswith("."))[-1])
+    with open(os.path.join(run_folder, "metrics.json"), 'r') as f:
+        metrics = json.load(f)
+    with open(os.path.join(run_folder, "manifest.json"), 'r') as f:
+        manifest = json.load(f)
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = {
+        'wall_seconds': wall,
+        'cpu_seconds': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        # ru_maxrss is in KiB on Linux; children is the largest single child (ffmpeg or an analysis worker)
+        'peak_rss_bytes': own.ru_maxrss * 1024,
+        'peak_child_rss_bytes': children.ru_maxrss * 1024,
+        'stage_status': {name: record['status'] for name, record in manifest['stages'].items()},
+        'run_folder': os.path.abspath(run_folder),
+        'metrics': metrics
+    }
+    with open(config['result_path'], 'w') as f:
+        json.dump(result, f)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_result(name, result):
+    stages = result['metrics']['stages']
+    failed = [stage for stage, status in result['stage_status'].items() if status != 'completed']
+    print(f"\n{name}: wall {result['wall_seconds']:.1f}s, cpu {result['cpu_seconds']:.1f}s, "
+          f"peak RSS {result['peak_rss_bytes'] / 1024 ** 2:.0f} MiB (children {result['peak_child_rss_bytes'] / 1024 ** 2:.0f} MiB)"
+          + (f", FAILED: {', '.join(failed)}" if failed else ""))
+    for stage, values in stages.items():
+        print(f"  {stage:<15} wall {values['wall_seconds']:8.2f}s  cpu {values['cpu_seconds']:8.2f}s  "
+              f"rss {values['peak_rss_bytes'] / 1024 ** 2:6.0f} MiB  "
+              f"in {values['bytes_in'] / 1024 ** 2:8.1f} MiB  out {values['bytes_out'] / 1024 ** 2:8.1f} MiB")
+    for name, value in {**result['metrics']['counters'], **result['metrics']['gauges']}.items():
+        print(f"  {name:<28} {value:,.2f}")
+
+async def run_scales(args):
+    from benchmarks.fake_services import FakeServices
+
+    fixtures = args.fixtures or tempfile.mkdtemp(prefix="bench_fixtures_")
+    services = await FakeServices(
+        fixtures, song_seconds=args.song_seconds, suno_latency=args.suno_latency,
+        suno_error_rate=args.suno_error_rate, request_latency=args.request_latency, suno_capacity=args.suno_capacity
+    ).start()
+    revision = git_revision()
+
+    try:
+        for name in args.scales:
+            scale = SCALES[name]
+            workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+            result_path = os.path.join(workdir, "result.json")
+            config = {
+                'http_url': services.http_url,
+                'https_url': services.https_url,
+                'cert_path': services.cert_path,
+                'workdir': workdir,
+                'result_path': result_path,
+                'command': args.command,
+                'profile': args.profile,
+                'suno_concurrency': args.suno_concurrency,
+                **scale
+            }
+            print(f"\n=== {name}: {scale['tracks']} prompts, target {scale['target_duration'] or 'all songs'} ===")
+            counts_before = dict(services.counts)
+            child = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "benchmarks.bench_pipeline", "--child", json.dumps(config), cwd=REPO_ROOT,
+                stdout=None if args.verbose else asyncio.subprocess.DEVNULL
+            )
+            await child.wait()
+            if child.returncode != 0 or not os.path.exists(result_path):
+                print(f"{name}: benchmark process failed with exit code {child.returncode}")
+                continue
+
+            with open(result_path, 'r') as f:
+                result = json.load(f)
+            result.update({
+                'scale': name,
+                **scale,
+                'command': args.command,
+                'revision': revision,
+                'song_seconds': args.song_seconds,
+                'suno_latency': args.suno_latency,
+                'suno_concurrency': args.suno_concurrency,
+                'suno_capacity': args.suno_capacity,
+                'requests': {key: services.counts[key] - counts_before[key] for key in services.counts}
+            })
+            print_result(name, result)
+            if args.output:
+                with open(args.output, 'a') as f:
+                    f.write(json.dumps(result) + "\n")
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        await services.stop()
+        if not args.fixtures:
+            shutil.rmtree(fixtures, ignore_errors=True)
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        run_child(json.loads(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=['small', 'medium', 'hour'])
+    parser.add_argument("--command", choices=['generate', 'mix', 'render', 'upload', 'full'], default='full',
+                        help="Stage to run up to, as with main.py (default: full)")
+    parser.add_argument("--song-seconds", type=float, default=180, help="Typical fixture song length")
+    parser.add_argument("--suno-latency", type=float, default=5.0, help="Seconds until a clip is streaming")
+    parser.add_argument("--suno-error-rate", type=float, default=0.0, help="Fraction of clips that fail")
+    parser.add_argument("--suno-capacity", type=int, help="Prompts Suno works on at once before answering 429")
+    parser.add_argument("--request-latency", type=float, default=0.05, help="Latency added to every API call")
+    parser.add_argument("--suno-concurrency", type=int, default=3)
+    parser.add_argument("--profile", action="append", default=[], metavar="STAGE")
+    parser.add_argument("--fixtures", help="Folder to keep generated fixtures in between benchmark runs")
+    parser.add_argument("--output", help="Append one JSON result per scale to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep each scale's run folder")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+    asyncio.run(run_scales(args))
+
+if __name__ == "__main__":
+    main()
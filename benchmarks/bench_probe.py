@@ -0,0 +1,67 @@
+"""
+Compares reading MP3 durations from the headers (src.audio.probe) against decoding them with pydub,
+on a folder of MP3s (e.g. a run's music/segments) or 100 synthetic files of mixed length and encoding.
+
+    python -m benchmarks.bench_probe --count 100
+    python -m benchmarks.bench_probe --folder Output/YYYYMMDD_HHMMSS/music/segments
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from pydub import AudioSegment
+from src.audio.probe import probe_mp3
+from src.utils.ffmpeg import get_ffmpeg_binary
+
+# Constant and variable bitrate, both with the Xing/Info header ffmpeg writes by default and without it
+ENCODINGS = [
+    ["-b:a", "192k"],
+    ["-q:a", "4"],
+    ["-b:a", "128k", "-write_xing", "0"],
+    ["-q:a", "2", "-write_xing", "0"]
+]
+
+def synthetic_files(folder, count):
+    paths = []
+    for i in range(count):
+        duration = 20 + (i * 37) % 220
+        path = os.path.join(folder, f"song_{i:03d}.mp3")
+        subprocess.run([
+            get_ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency={110 + 11 * i}:sample_rate=44100:duration={duration}",
+            "-ac", "2", *ENCODINGS[i % len(ENCODINGS)], "-f", "mp3", path
+        ], check=True)
+        paths.append(path)
+    return paths
+
+def measure(label, func, paths):
+    wall, cpu = time.perf_counter(), time.process_time()
+    durations = [func(path) for path in paths]
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(f"{label:<8} wall {wall:8.3f}s  cpu {cpu:8.3f}s  per file {wall / len(paths) * 1000:8.2f} ms")
+    return durations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", help="Folder searched recursively for MP3s instead of synthetic files")
+    parser.add_argument("--count", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.folder:
+            paths = sorted(os.path.join(root, name) for root, _, names in os.walk(args.folder)
+                           for name in names if name.endswith(".mp3"))[:args.count]
+        else:
+            paths = synthetic_files(folder, args.count)
+        size = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+        print(f"{len(paths)} files, {size:.1f} MiB")
+
+        probed = measure("probe", lambda path: probe_mp3(path)['duration'], paths)
+        decoded = measure("pydub", lambda path: len(AudioSegment.from_mp3(path)) / 1000, paths)
+
+        errors = sorted(abs(a - b) * 1000 for a, b in zip(probed, decoded))
+        print(f"Duration difference: median {errors[len(errors) // 2]:.1f} ms, max {errors[-1]:.1f} ms")
+
+if __name__ == "__main__":
+    main()
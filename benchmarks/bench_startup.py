@@ -0,0 +1,57 @@
+"""
+Guards CLI startup: times `python main.py --help` and checks that building the pipeline
+does not import any heavy dependency. Exits non-zero when the budget is exceeded.
+
+    python -m benchmarks.bench_startup --budget 0.3
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ['anthropic', 'numpy', 'scipy', 'pydub', 'moviepy', 'googleapiclient', 'aiohttp', 'requests']
+
+CHECK_IMPORTS = f"""
+import sys, asyncio, tempfile
+import main
+from src.pipeline.stages import build_pipeline
+
+async def build():
+    folder = tempfile.mkdtemp()
+    build_pipeline({{'run': folder, 'music': folder, 'music_segments': folder, 'photos': folder, 'videos': folder}})
+
+asyncio.run(build())
+print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+"""
+
+def time_help(runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "--help"], check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=0.3, help="Median startup budget in seconds")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    timings = time_help(args.runs)
+    median = statistics.median(timings)
+    print(f"main.py --help: median {median * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms over {args.runs} runs")
+
+    loaded = subprocess.run([sys.executable, "-c", CHECK_IMPORTS], check=True, capture_output=True, text=True)
+    heavy = [name for name in loaded.stdout.strip().split(",") if name]
+    if heavy:
+        print(f"Heavy modules imported at startup: {', '.join(heavy)}")
+
+    if median > args.budget or heavy:
+        print(f"FAIL: startup budget is {args.budget * 1000:.0f} ms with no heavy imports")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compares the ffmpeg static-image encoder against the MoviePy render path on a synthetic mix.
+
+    python -m benchmarks.bench_video --minutes 60
+"""
+import argparse
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from src.utils.ffmpeg import get_ffmpeg_binary
+from src.video.creator import encode_static_video, create_video_with_moviepy
+
+def synthetic_mix(path, minutes):
+    subprocess.run([
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=44100:duration={minutes * 60}",
+        "-ac", "2", "-f", "mp3", path
+    ], check=True)
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def measure(label, func, *args):
+    wall, cpu = time.perf_counter(), cpu_seconds()
+    func(*args)
+    wall, cpu = time.perf_counter() - wall, cpu_seconds() - cpu
+    size = os.path.getsize(args[2]) / 1024 / 1024
+    print(f"{label:<8} wall {wall:8.1f}s  cpu {cpu:8.1f}s  output {size:.1f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--image", default="assets/default_background.jpg")
+    parser.add_argument("--skip-moviepy", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        audio_path = os.path.join(folder, "mix.mp3")
+        synthetic_mix(audio_path, args.minutes)
+
+        measure("ffmpeg", encode_static_video, audio_path, args.image, os.path.join(folder, "fast.mp4"))
+        if not args.skip_moviepy:
+            measure("moviepy", create_video_with_moviepy, audio_path, args.image, os.path.join(folder, "moviepy.mp4"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures the visualizer render mode on a synthetic mix: the STFT pass, frame rendering on its own,
+and the full parallel render and encode at each worker count.
+
+    python -m benchmarks.bench_visualizer --minutes 60 --workers 1 2 4 8
+    python -m benchmarks.bench_visualizer --minutes 10 --style waveform
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+import numpy as np
+from src.utils.ffmpeg import get_ffmpeg_binary
+from src.video.visualizer import (ANALYSIS_RATE, FRAME_RATE, FrameRenderer, band_energies, encode_visualized_video,
+                                  load_background)
+
+def synthetic_mix(audio_path, analysis_path, minutes):
+    """
+    A beeping tone over pink noise, encoded to AAC plus the mono float32 copy the visualizer reads
+    """
+    duration = minutes * 60
+    subprocess.run([
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=220:beep_factor=4:sample_rate=44100:duration={duration}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.1:sample_rate=44100:duration={duration}",
+        "-filter_complex", "amix=inputs=2:duration=shortest,asplit[a][b]",
+        "-map", "[a]", "-ac", "2", "-c:a", "aac", "-b:a", "192k", "-f", "ipod", audio_path,
+        "-map", "[b]", "-ac", "1", "-ar", str(ANALYSIS_RATE), "-f", "f32le", analysis_path
+    ], check=True)
+
+def synthetic_timestamps(minutes, track_minutes=3):
+    starts = range(0, int(minutes), track_minutes)
+    return [{'title': f"Track {i} (Variation A)", 'timestamp': f"{start // 60}:{start % 60:02d}:00"}
+            for i, start in enumerate(starts, 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--image", default="assets/default_background.jpg")
+    parser.add_argument("--style", choices=['spectrum', 'waveform'], default='spectrum')
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--render-frames", type=int, default=3000, help="Frames rendered without encoding")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        audio_path = os.path.join(folder, "mix.m4a")
+        analysis_path = os.path.join(folder, "mix.f32")
+        synthetic_mix(audio_path, analysis_path, args.minutes)
+        samples = np.memmap(analysis_path, dtype=np.float32, mode='r')
+        frames = int(len(samples) * FRAME_RATE / ANALYSIS_RATE)
+        print(f"{args.minutes:g} minute mix, {frames} frames at {FRAME_RATE} fps")
+
+        started = time.perf_counter()
+        levels = band_energies(samples)
+        print(f"stft     {time.perf_counter() - started:8.2f}s")
+
+        renderer = FrameRenderer(load_background(args.image), args.style, titles=[(0, "Track 1 (Variation A)")])
+        count = min(args.render_frames, frames)
+        started = time.perf_counter()
+        for index in range(count):
+            start = int(index / FRAME_RATE * ANALYSIS_RATE)
+            renderer.render(index / FRAME_RATE, levels=levels[index], samples=samples[start:start + renderer.window])
+        print(f"render   {count / (time.perf_counter() - started):8.1f} fps (one process, no encode)")
+        del samples
+
+        timestamps = synthetic_timestamps(args.minutes)
+        for workers in args.workers:
+            output_path = os.path.join(folder, f"visualized_{workers}.mp4")
+            started = time.perf_counter()
+            rendered = encode_visualized_video(audio_path, analysis_path, args.image, timestamps, output_path,
+                                               style=args.style, workers=workers)
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(output_path) / 1024 / 1024
+            print(f"encode   {rendered / elapsed:8.1f} fps  {rendered / FRAME_RATE / elapsed:6.1f}x realtime  "
+                  f"wall {elapsed:8.1f}s  workers {workers}  output {size:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Local stand-ins for every service a run talks to, so the pipeline can be benchmarked without API credits:
+
+    Suno        POST /api/generate, GET /api/get, GET /audio/<clip>.mp3 (with Range support)
+    OpenAI      POST /v1/images/generations, GET /images/background.jpg
+    Anthropic   POST /v1/messages
+    YouTube     resumable upload: POST /upload/..., PUT /upload/session/<id>
+
+The same app is served over HTTP and, for googleapiclient (which keeps https for media uploads), over HTTPS
+with a throwaway self-signed certificate. Audio comes from synthetic MP3 fixtures made with ffmpeg.
+"""
+import os
+import re
+import json
+import ssl
+import time
+import uuid
+import random
+import asyncio
+import subprocess
+from aiohttp import web
+from src.utils.ffmpeg import get_ffmpeg_binary
+
+# Relative lengths of the audio fixtures, so packing to a target duration has different songs to choose from
+FIXTURE_SCALES = (0.8, 0.9, 1.0, 1.1, 1.2)
+
+def make_audio_fixtures(folder, song_seconds):
+    """
+    Writes one MP3 per FIXTURE_SCALES entry (a tone over noise, different per fixture) and returns their paths
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i, scale in enumerate(FIXTURE_SCALES):
+        duration = song_seconds * scale
+        path = os.path.join(folder, f"song_{int(duration)}s_{i}.mp3")
+        if not os.path.exists(path):
+            subprocess.run([
+                get_ffmpeg_binary(), "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"sine=frequency={220 + 55 * i}:sample_rate=44100:duration={duration}",
+                "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:sample_rate=44100:duration={duration}",
+                "-filter_complex", "amix=inputs=2:duration=shortest", "-ac", "2", "-b:a", "192k",
+                "-f", "mp3", path
+            ], check=True)
+        paths.append(path)
+    return paths
+
+def make_image_fixture(folder):
+    path = os.path.join(folder, "background.jpg")
+    if not os.path.exists(path):
+        subprocess.run([
+            get_ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=c=0x2a2250:s=1792x1024", "-frames:v", "1", path
+        ], check=True)
+    return path
+
+def make_certificate(folder):
+    """
+    Self-signed certificate for 127.0.0.1; point HTTPLIB2_CA_CERTS at the returned cert to trust it
+    """
+    cert_path, key_path = os.path.join(folder, "cert.pem"), os.path.join(folder, "key.pem")
+    if not os.path.exists(cert_path):
+        subprocess.run([
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", key_path, "-out", cert_path,
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"
+        ], check=True, capture_output=True)
+    return cert_path, key_path
+
+class FakeServices:
+    """
+    Serves the fake endpoints. Suno clips move from submitted to streaming after suno_latency seconds
+    (and to complete after twice that); suno_error_rate of clips end in an error instead.
+    With suno_capacity set, generate answers 429 with a Retry-After while that many prompts are still queued.
+    request_latency is added to every API call.
+    """
+    def __init__(self, fixtures_folder, song_seconds=180, suno_latency=5.0, suno_error_rate=0.0, request_latency=0.05,
+                 suno_capacity=None):
+        self.fixtures_folder = fixtures_folder
+        self.song_seconds = song_seconds
+        self.suno_latency = suno_latency
+        self.suno_error_rate = suno_error_rate
+        self.request_latency = request_latency
+        self.suno_capacity = suno_capacity
+        self.clips = {}
+        self.uploads = {}
+        self.counts = {'generate': 0, 'rate_limited': 0, 'get': 0, 'audio': 0, 'images': 0, 'messages': 0, 'upload_chunks': 0}
+        self.runner = None
+        self.http_url = None
+        self.https_url = None
+
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_get("/api/get", self.get_clips)
+        app.router.add_get("/audio/{clip_id}.mp3", self.audio)
+        app.router.add_post("/v1/images/generations", self.images)
+        app.router.add_get("/images/background.jpg", self.image_file)
+        app.router.add_post("/v1/messages", self.messages)
+        app.router.add_put("/upload/session/{session_id}", self.upload_chunk)
+        app.router.add_post("/upload/{tail:.*}", self.upload_start)
+        self.app = app
+
+    async def start(self, host="127.0.0.1"):
+        self.audio_fixtures = make_audio_fixtures(os.path.join(self.fixtures_folder, "audio"), self.song_seconds)
+        self.image_fixture = make_image_fixture(self.fixtures_folder)
+        self.cert_path, key_path = make_certificate(self.fixtures_folder)
+
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(self.cert_path, key_path)
+
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        http_site = web.TCPSite(self.runner, host, 0)
+        https_site = web.TCPSite(self.runner, host, 0, ssl_context=ssl_context)
+        await http_site.start()
+        await https_site.start()
+        self.http_url = f"http://{host}:{http_site._server.sockets[0].getsockname()[1]}"
+        self.https_url = f"https://{host}:{https_site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def _delay(self):
+        if self.request_latency:
+            await asyncio.sleep(self.request_latency)
+
+    # Suno
+
+    async def generate(self, request):
+        await self._delay()
+        if self.suno_capacity:
+            queued = sum(1 for clip in self.clips.values() if self._clip_status(clip) in ('submitted', 'queued'))
+            if queued >= self.suno_capacity * 2:
+                self.counts['rate_limited'] += 1
+                return web.json_response({'error': "Too many requests"}, status=429,
+                                         headers={'Retry-After': str(max(int(self.suno_latency / 2), 1))})
+        self.counts['generate'] += 1
+        payload = await request.json()
+        clips = []
+        for _ in range(2):
+            clip_id = str(uuid.uuid4())
+            self.clips[clip_id] = {
+                'created': time.monotonic(),
+                'prompt': payload.get('prompt'),
+                'fixture': random.randrange(len(self.audio_fixtures)),
+                'fails': random.random() < self.suno_error_rate
+            }
+            clips.append({'id': clip_id, 'status': 'submitted', 'audio_url': ""})
+        return web.json_response(clips)
+
+    def _clip_status(self, clip):
+        age = time.monotonic() - clip['created']
+        if age < self.suno_latency * 0.2:
+            return 'submitted'
+        if age < self.suno_latency:
+            return 'queued'
+        if clip['fails']:
+            return 'error'
+        return 'streaming' if age < self.suno_latency * 2 else 'complete'
+
+    async def get_clips(self, request):
+        await self._delay()
+        self.counts['get'] += 1
+        clips = []
+        for clip_id in request.query.get('ids', "").split(","):
+            clip = self.clips.get(clip_id)
+            if clip is None:
+                continue
+            clips.append({
+                'id': clip_id,
+                'status': self._clip_status(clip),
+                'audio_url': f"{self.http_url}/audio/{clip_id}.mp3",
+                'prompt': clip['prompt']
+            })
+        return web.json_response(clips)
+
+    async def audio(self, request):
+        clip = self.clips.get(request.match_info['clip_id'])
+        if clip is None:
+            raise web.HTTPNotFound()
+        self.counts['audio'] += 1
+        # FileResponse handles Range requests, so resumed downloads get a 206
+        return web.FileResponse(self.audio_fixtures[clip['fixture']])
+
+    # OpenAI
+
+    async def images(self, request):
+        await self._delay()
+        self.counts['images'] += 1
+        return web.json_response({'created': int(time.time()), 'data': [{'url': f"{self.http_url}/images/background.jpg"}]})
+
+    async def image_file(self, request):
+        return web.FileResponse(self.image_fixture)
+
+    # Anthropic
+
+    async def messages(self, request):
+        await self._delay()
+        self.counts['messages'] += 1
+        payload = await request.json()
+        content = payload['messages'][-1]['content']
+        if isinstance(content, list):
+            content = " ".join(block.get('text', "") for block in content)
+
+        if "TITLE:" in content:
+            text = ("TITLE: Benchmark Mix - Synthetic Tones to Measure By\n"
+                    "DESCRIPTION:\nA mix of synthetic songs made for benchmarking. All music is AI-generated.\n"
+                    "[TIMESTAMPS]\n#benchmark #lofi")
+        else:
+            match = re.search(r"Generate (\d+) unique entries", content)
+            count = int(match.group(1)) if match else 15
+            # Random words keep the prompts clear of the prompt pool's near-duplicate check
+            entries = [{'title': f"Benchmark Song {uuid.uuid4().hex[:6]}",
+                        'prompt': "Synthetic track " + " ".join(uuid.uuid4().hex[:7] for _ in range(12))}
+                       for _ in range(count)]
+            text = json.dumps(entries, indent=2)
+
+        return web.json_response({
+            'id': f"msg_{uuid.uuid4().hex}",
+            'type': "message",
+            'role': "assistant",
+            'model': payload.get('model', "benchmark"),
+            'content': [{'type': "text", 'text': text}],
+            'stop_reason': "end_turn",
+            'stop_sequence': None,
+            'usage': {'input_tokens': len(content) // 4, 'output_tokens': len(text) // 4}
+        })
+
+    # YouTube
+
+    async def upload_start(self, request):
+        await self._delay()
+        session_id = uuid.uuid4().hex
+        self.uploads[session_id] = {'received': 0, 'total': int(request.headers.get('X-Upload-Content-Length', 0))}
+        location = f"{self.https_url}/upload/session/{session_id}"
+        return web.Response(status=200, headers={'Location': location})
+
+    async def upload_chunk(self, request):
+        upload = self.uploads.get(request.match_info['session_id'])
+        if upload is None:
+            raise web.HTTPNotFound()
+        self.counts['upload_chunks'] += 1
+
+        content_range = request.headers.get('Content-Range', "")
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range)
+        body = await request.read()
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            if start == upload['received'] and end - start + 1 == len(body):
+                upload['received'] = end + 1
+            if match.group(3) != "*":
+                upload['total'] = int(match.group(3))
+
+        if upload['total'] and upload['received'] >= upload['total']:
+            return web.json_response({'id': f"bench{request.match_info['session_id'][:6]}", 'kind': "youtube#video"})
+        headers = {'Range': f"bytes=0-{upload['received'] - 1}"} if upload['received'] else {}
+        return web.Response(status=308, headers=headers)
@@ -1,47 +1,94 @@
 import os
+import sys
+import time
 import asyncio
-from src.utils.file_manager import create_run_folders
-from src.utils.prompt_generator import get_prompts_from_gpt
-from src.audio.generator import generate_all_songs_async
-from src.audio.processor import concatenate_audio_files
-from src.image.generator import generate_background_image
-from src.video.creator import create_video_with_image
-from src.youtube.uploader import generate_video_metadata, upload_to_youtube
-
-async def main():
-    # Create folder structure for this run
-    folders = create_run_folders()
-    
-    # Get prompts and titles
-    titles_and_prompts = get_prompts_from_gpt()
-    print(f"Titles and Prompts: {titles_and_prompts}")
-    
-    # Generate individual songs and track their information
-    all_songs = await generate_all_songs_async(titles_and_prompts, folders['music_segments'], concurrent_limit=3)
-    
-    # Combine audio files and get timestamps
-    combined_audio_path, timestamps = concatenate_audio_files(all_songs, folders['music'])
-    
-    # Generate and save background image
-    image_path = generate_background_image(titles_and_prompts, folders['photos'])
-    
-    # Create and save video
-    output_video_path = os.path.join(folders['videos'], "playlist_video.mp4")
-    create_video_with_image(combined_audio_path, image_path, output_video_path)
-    
-    # Generate metadata and upload to YouTube
-    print("\nGenerating video metadata...")
-    title, description = generate_video_metadata(timestamps)
-    
-    print("\nUploading to YouTube...")
-    video_id = upload_to_youtube(output_video_path, title, description)
-    
-    if video_id:
-        print(f"\nVideo uploaded successfully! ID: {video_id}")
-    else:
-        print("\nVideo upload failed.")
-    
-    print(f"\nRun completed! All files are stored in: {os.path.dirname(folders['music'])}")
+import argparse
+
+# Also write the mix as a standalone combined_playlist.mp3 next to the video
+KEEP_MP3 = False
+
+# Pipeline stages each command runs up to; everything they depend on runs (or is skipped) first
+COMMAND_TARGETS = {
+    'generate': ['songs'],
+    'mix': ['mix'],
+    'render': ['render'],
+    'upload': ['upload'],
+    'full': ['upload']
+}
+
+def parse_args(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # `python main.py [options]` without a command keeps meaning a full run
+    if not argv or (argv[0] not in COMMAND_TARGETS and argv[0] not in ('-h', '--help')):
+        argv.insert(0, 'full')
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--run", "--resume", dest="run", metavar="RUN",
+                        help="Work in an earlier run (Output/<timestamp> or just the timestamp), skipping completed stages")
+    common.add_argument("--genre", default="lofi jazz", help="Genre of the mix (default: lofi jazz)")
+    common.add_argument("--tracks", type=int, default=15, help="Number of prompts to generate songs for (default: 15)")
+    common.add_argument("--target-duration", type=float, metavar="SECONDS",
+                        help="Pack the mix to this length (within 10s) instead of using every song")
+    common.add_argument("--pool-size", type=int, default=0,
+                        help="Extra songs drawn from the cached library to pack the mix from (default: 0)")
+    common.add_argument("--suno-concurrency", type=int, default=3,
+                        help="Songs generated at once to start with, shared across all mixes (default: 3)")
+    common.add_argument("--suno-max-concurrency", type=int, default=10,
+                        help="Upper bound the Suno concurrency may grow to while Suno keeps up (default: 10)")
+    common.add_argument("--image-reuse", choices=['exact', 'mood', 'any', 'never'], default='mood',
+                        help="When to reuse a cached background image instead of calling DALL-E (default: mood)")
+    common.add_argument("--visualizer", choices=['spectrum', 'waveform'],
+                        help="Render spectrum bars or a waveform and the now-playing title instead of a still image")
+    common.add_argument("--profile", action="append", default=[], metavar="STAGE",
+                        help="Run a stage under cProfile, dumping to <run>/profile (repeatable, or 'all')")
+
+    parser = argparse.ArgumentParser(description="Generate a lofi jazz mix and upload it to YouTube")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.add_parser("generate", parents=[common], help="Generate prompts and songs")
+    commands.add_parser("mix", parents=[common], help="Mix the songs into a standalone combined_playlist.mp3")
+    commands.add_parser("render", parents=[common], help="Mix the songs straight into the video")
+    commands.add_parser("upload", parents=[common], help="Write the metadata and upload the video")
+    full = commands.add_parser("full", parents=[common], help="Run every stage (default)")
+    full.add_argument("--batch", metavar="SPECS",
+                      help="JSON file listing several mixes (genre, tracks, target_duration) to produce in one process")
+    full.add_argument("--cpu-workers", type=int, default=2,
+                      help="Mixes analyzed, mixed and encoded at once in batch mode (default: 2)")
+    return parser.parse_args(argv)
+
+async def main(resume=None, concurrent_limit=3, target_duration=None, pool_size=0, command='full', profile=(),
+               genre="lofi jazz", tracks=15, max_concurrency=10, image_reuse='mood', visualizer=None):
+    from src.utils.file_manager import create_run_folders
+    from src.pipeline.stages import build_pipeline
+
+    start_time = time.perf_counter()
+
+    # Create folder structure for this run, or reopen the one being resumed
+    folders = create_run_folders(resume)
+    pipeline = build_pipeline(folders, concurrent_limit=concurrent_limit, keep_mp3=KEEP_MP3, genre=genre, tracks=tracks,
+                              target_duration=target_duration, pool_size=pool_size, profile=profile,
+                              max_concurrency=max_concurrency, image_reuse=image_reuse, visualizer=visualizer)
+
+    try:
+        results = await pipeline.run(COMMAND_TARGETS[command])
+        if 'upload' in results:
+            print(f"\nVideo uploaded successfully! ID: {results['upload']['video_id']}")
+    except Exception as e:
+        print(f"\nRun failed: {e}")
+        print(f"Resume it with: python main.py {command} --run {folders['run']}")
+        return 1
+
+    print(f"\nRun completed in {time.perf_counter() - start_time:.1f}s! All files are stored in: {folders['run']}")
+    print(f"Stage metrics: {os.path.join(folders['run'], 'metrics.json')}")
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    args = parse_args()
+    if getattr(args, 'batch', None):
+        from src.pipeline.batch import load_specs, run_batch
+        outcomes = asyncio.run(run_batch(load_specs(args.batch), args.suno_concurrency, args.cpu_workers, KEEP_MP3,
+                                         args.profile, args.suno_max_concurrency))
+        sys.exit(0 if all(outcomes) else 1)
+    else:
+        sys.exit(asyncio.run(main(args.run, args.suno_concurrency, args.target_duration, args.pool_size, args.command,
+                                  args.profile, args.genre, args.tracks, args.suno_max_concurrency,
+                                  args.image_reuse, args.visualizer)))
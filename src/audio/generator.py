@@ -1,26 +1,50 @@
 import os
+import time
+import random
 import asyncio
 import aiohttp
 from ..config import BASE_URL
 from ..utils.file_manager import create_folder_for_prompt
+from ..utils.metrics import get_metrics
+from ..utils.limiter import AdaptiveLimiter, RetryBudget, parse_retry_after
+from .library import SongLibrary
+from .probe import record_durations
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Generation parameters sent with every prompt; part of the song library key
+GENERATION_PARAMS = {
+    "make_instrumental": True
+}
+
+class SunoOverloaded(Exception):
+    """
+    Suno answered with 429 or a 5xx, or timed out; retry_after is the server's requested delay in seconds, if any
+    """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 async def generate_audio_by_prompt_async(prompt, session):
     """
-    Async version of generate_audio_by_prompt
+    Async version of generate_audio_by_prompt.
+    Raises SunoOverloaded on 429, 5xx and timeouts so the caller can back off, and other errors as they are.
     """
     payload = {
         "prompt": prompt,
-        "make_instrumental": True,
+        **GENERATION_PARAMS,
         "wait_audio": False
     }
     url = f"{BASE_URL}/api/generate"
     try:
         async with session.post(url, json=payload) as response:
+            if response.status == 429 or response.status >= 500:
+                raise SunoOverloaded(f"Suno returned {response.status} for prompt '{prompt}'",
+                                     parse_retry_after(response.headers.get('Retry-After')))
             response.raise_for_status()
             return await response.json()
-    except Exception as e:
-        print(f"Error generating audio for prompt '{prompt}': {e}")
-        return None
+    except (asyncio.TimeoutError, aiohttp.ServerTimeoutError) as e:
+        raise SunoOverloaded(f"Suno timed out generating prompt '{prompt}': {e}") from e
 
 async def get_audio_information_async(audio_ids, session):
     """
@@ -29,103 +53,332 @@ async def get_audio_information_async(audio_ids, session):
     url = f"{BASE_URL}/api/get?ids={audio_ids}"
     try:
         async with session.get(url) as response:
+            if response.status == 429 or response.status >= 500:
+                raise SunoOverloaded(f"Suno returned {response.status} while polling",
+                                     parse_retry_after(response.headers.get('Retry-After')))
             response.raise_for_status()
             return await response.json()
+    except SunoOverloaded:
+        raise
     except Exception as e:
         print(f"Error retrieving audio information for IDs '{audio_ids}': {e}")
         return None
 
-async def download_audio_file_async(audio_url, file_path, session, retries=3):
+class ClipPoller:
     """
-    Async version of download_audio_file
+    Shared status poller that checks every outstanding clip with a single /api/get request per tick.
+    The interval resets whenever a clip finishes and otherwise backs off exponentially with jitter.
     """
+    READY_STATUSES = ('streaming', 'complete')
+
+    def __init__(self, session, min_interval=2.0, max_interval=15.0, backoff=1.5, deadline=300):
+        self.session = session
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.deadline = deadline
+        self.waiters = {}
+        self.task = None
+
+    async def wait(self, clip_ids, deadline=None):
+        """
+        Resolves with the audio information of each clip, in order, once all of them are streaming or complete
+        """
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + (deadline or self.deadline)
+        futures = []
+        for clip_id in clip_ids:
+            future = loop.create_future()
+            self.waiters[clip_id] = (future, expires)
+            futures.append(future)
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+        try:
+            return await asyncio.gather(*futures)
+        finally:
+            for clip_id, future in zip(clip_ids, futures):
+                if self.waiters.get(clip_id, (None,))[0] is future:
+                    del self.waiters[clip_id]
+                if not future.done():
+                    future.cancel()
+
+    async def _run(self):
+        try:
+            await self._poll()
+        except BaseException as e:
+            # Nothing else resolves the waiters, so fail them instead of leaving every wait() hanging
+            for future, _ in list(self.waiters.values()):
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Clip status polling stopped: {e!r}"))
+            if not isinstance(e, Exception):
+                raise
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        interval = self.min_interval
+        while self.waiters:
+            await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+            if not self.waiters:
+                break
+
+            metrics = get_metrics()
+            metrics.increment('suno_poll_requests')
+            metrics.increment('suno_clip_polls', len(self.waiters))
+            retry_after = 0
+            progressed = False
+            try:
+                audio_info = await get_audio_information_async(",".join(self.waiters), self.session)
+                if audio_info is not None and not isinstance(audio_info, list):
+                    print(f"Unexpected clip status response: {audio_info!r:.200}")
+                    audio_info = None
+                for clip in audio_info or []:
+                    if not isinstance(clip, dict):
+                        continue
+                    future, _ = self.waiters.get(clip.get('id'), (None, None))
+                    if future is None or future.done():
+                        continue
+                    if clip.get('status') in self.READY_STATUSES:
+                        future.set_result(clip)
+                        progressed = True
+                    elif clip.get('status') == 'error':
+                        future.set_exception(RuntimeError(f"Suno reported an error for clip {clip['id']}"))
+                        progressed = True
+            except SunoOverloaded as e:
+                print(f"{e}, backing off")
+                retry_after = e.retry_after or 0
+            except Exception as e:
+                print(f"Error polling clip status: {e}")
+
+            now = loop.time()
+            for clip_id, (future, expires) in list(self.waiters.items()):
+                if not future.done() and now > expires:
+                    future.set_exception(asyncio.TimeoutError(f"Timed out waiting for clip {clip_id}"))
+
+            interval = self.min_interval if progressed else min(interval * self.backoff, self.max_interval)
+            interval = max(interval, retry_after)
+
+async def download_audio_file_async(audio_url, file_path, session, retries=3, backoff=2.0):
+    """
+    Streams an audio file to disk in chunks through a .part file that is renamed once complete.
+    Retries resume where the last attempt stopped using an HTTP Range request, with exponential backoff,
+    and file writes run in a worker thread so a slow disk does not stall the event loop.
+    """
+    part_path = f"{file_path}.part"
     for attempt in range(retries):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f"bytes={offset}-"} if offset else {}
         try:
-            async with session.get(audio_url) as response:
+            async with session.get(audio_url, headers=headers) as response:
+                if response.status == 416:
+                    # Our partial file doesn't match the server's copy; start over
+                    os.remove(part_path)
                 response.raise_for_status()
-                with open(file_path, 'wb') as audio_file:
-                    audio_file.write(await response.read())
+                
+                # A plain 200 means the server ignored the Range header, so the file is rewritten from scratch
+                mode = 'ab' if offset and response.status == 206 else 'wb'
+                audio_file = await asyncio.to_thread(open, part_path, mode)
+                try:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        await asyncio.to_thread(audio_file.write, chunk)
+                        get_metrics().increment('download_bytes', len(chunk))
+                finally:
+                    await asyncio.to_thread(audio_file.close)
+            
+            os.replace(part_path, file_path)
             print(f"Downloaded: {file_path}")
             return True
         except Exception as e:
             print(f"Attempt {attempt+1}/{retries} failed to download {file_path}: {e}")
-            await asyncio.sleep(2)
+            if attempt < retries - 1:
+                await asyncio.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
     print(f"Failed to download {file_path} after {retries} attempts.")
     return False
 
-async def generate_all_songs_async(titles_and_prompts, music_folder, concurrent_limit=3):
+def create_session(connection_limit=20, keepalive_timeout=60):
     """
-    Generates multiple songs concurrently with a limit on simultaneous generations
+    Creates the HTTP session shared by every Suno request and download, with a pooled keep-alive connector
     """
-    all_songs = []
-    semaphore = asyncio.Semaphore(concurrent_limit)
+    connector = aiohttp.TCPConnector(
+        limit=connection_limit,
+        limit_per_host=connection_limit,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=60)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+async def iter_songs_async(titles_and_prompts, music_folder, concurrent_limit=3, use_library=True,
+                           poll_deadline=300, limiter=None, pool_size=0, max_concurrency=10, max_attempts=3):
+    """
+    Generates multiple songs concurrently under an adaptive concurrency limit (starting at concurrent_limit,
+    growing up to max_concurrency while Suno keeps up and backing off when it is overloaded),
+    yielding each prompt's list of variations as soon as it is ready so downstream work can start early.
+    Pass a shared limiter to enforce one Suno concurrency budget across several runs.
+    Failed songs are retried up to max_attempts times, within a retry budget shared by the whole call.
+    Prompts already rendered in an earlier run are restored from the song library without calling Suno,
+    and pool_size extra songs from earlier runs can be drawn from the library to pack a mix from.
+    Generation status is polled for all songs at once, giving up on a song after poll_deadline seconds.
+    """
+    limiter = limiter or AdaptiveLimiter(concurrent_limit, max_limit=max(max_concurrency, concurrent_limit))
+    retry_budget = RetryBudget()
+    library = SongLibrary() if use_library else None
+    metrics = get_metrics()
     
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for title, prompt in titles_and_prompts:
-            task = asyncio.create_task(generate_single_song(
-                title, prompt, music_folder, session, semaphore
-            ))
-            tasks.append(task)
+    try:
+        async with create_session() as session:
+            poller = ClipPoller(session, deadline=poll_deadline)
+            tasks = {}
+            for index, (title, prompt) in enumerate(titles_and_prompts):
+                if library:
+                    cached = library.restore(title, prompt, GENERATION_PARAMS, create_folder_for_prompt(prompt, music_folder))
+                    if cached:
+                        print(f"Using cached song from library: {title}")
+                        yield cached
+                        continue
+                task = asyncio.create_task(generate_single_song(
+                    title, prompt, music_folder, session, limiter, poller, retry_budget, max_attempts,
+                    song_key=f"{index}: {title}"
+                ))
+                tasks[task] = (title, prompt)
+            
+            if library and pool_size:
+                pool = library.sample(pool_size, GENERATION_PARAMS, music_folder,
+                                      exclude_prompts=[prompt for _, prompt in titles_and_prompts])
+                print(f"Added {len(pool)} songs from the library pool")
+                for song_info in pool:
+                    yield song_info
+            
+            started = time.monotonic()
+            generated = failed = 0
+            try:
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        title, prompt = tasks[task]
+                        if task.exception():
+                            print(f"Giving up on song '{title}': {task.exception()}")
+                            failed += 1
+                            metrics.increment('songs_failed')
+                            continue
+                        result = task.result()
+                        generated += len(result)
+                        if library:
+                            library.add(prompt, GENERATION_PARAMS, result)
+                        yield result
+            finally:
+                for task in tasks:
+                    task.cancel()
+            
+            if tasks:
+                minutes = (time.monotonic() - started) / 60
+                songs_per_minute = generated / max(minutes, 1e-9)
+                metrics.observe('songs_per_minute', songs_per_minute)
+                metrics.observe('suno_concurrency_limit', limiter.limit)
+                print(f"Generated {generated} songs in {minutes:.1f} minutes ({songs_per_minute:.1f} songs/minute, "
+                      f"{failed} prompts failed, {retry_budget.retries} retries, concurrency now {int(limiter.limit)})")
+    finally:
+        if library:
+            library.close()
+
+async def generate_all_songs_async(titles_and_prompts, music_folder, concurrent_limit=3, use_library=True,
+                                   poll_deadline=300):
+    """
+    Generates multiple songs concurrently and returns them all once every generation has finished
+    """
+    all_songs = []
+    async for song_info in iter_songs_async(titles_and_prompts, music_folder, concurrent_limit,
+                                            use_library, poll_deadline):
+        # Flatten the list of variations into the main song list
+        all_songs.extend(song_info)
+    return all_songs
+
+async def generate_song_attempt(title, prompt, prompt_folder, session, limiter, poller, song_key=None,
+                                download_attempts=3, backoff=2.0):
+    """
+    One attempt at generating and downloading both variations of a prompt; raises on any failure.
+    The limiter slot is held only while Suno is generating and is released before downloading,
+    and Suno's answer (streaming in time, or overloaded) is fed back into the limiter.
+    Failed downloads of the generated clips are retried (resuming their .part files) with exponential
+    backoff before giving up, so a network error doesn't cost a new generation.
+    Latencies are recorded under song_key (the title by default), which must be unique per prompt.
+    """
+    metrics = get_metrics()
+    song_key = song_key or title
+    async with limiter:
+        # Generate the audio
+        metrics.song_event(song_key, 'submitted')
+        try:
+            response = await generate_audio_by_prompt_async(prompt, session)
+        except SunoOverloaded as e:
+            limiter.record_overload(e.retry_after)
+            raise
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # The response contains a list of two variations
+        if not isinstance(response, list) or len(response) < 2:
+            raise RuntimeError(f"Unexpected response format for prompt: {prompt}")
         
-        for result in results:
-            if isinstance(result, Exception):
-                print(f"Error generating song: {result}")
-            elif result:
-                # Flatten the list of variations into the main song list
-                all_songs.extend(result)
+        ids = [response[0]['id'], response[1]['id']]
+        print(f"Song IDs: {','.join(ids)}")
+        
+        # Wait until both variations are streamable
+        try:
+            audio_info = await poller.wait(ids)
+        except asyncio.TimeoutError as e:
+            limiter.record_overload()
+            raise SunoOverloaded(f"Timeout waiting for audio generation: {title}") from e
+        limiter.record_success()
+        metrics.song_event(song_key, 'streaming')
     
-    return all_songs
+    file_paths = [os.path.join(prompt_folder, f"{audio_info[i]['id']}.mp3") for i in range(2)]
+    pending = [0, 1]
+    for attempt in range(1, download_attempts + 1):
+        results = await asyncio.gather(*(
+            download_audio_file_async(audio_info[i]["audio_url"], file_paths[i], session) for i in pending
+        ))
+        pending = [i for i, ok in zip(pending, results) if not ok]
+        if not pending:
+            break
+        if attempt == download_attempts:
+            raise RuntimeError(f"Failed to download the variations of '{title}'")
+        delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        print(f"Download {attempt}/{download_attempts} of '{title}' failed. Retrying in {delay:.1f}s")
+        metrics.increment('download_retries')
+        await asyncio.sleep(delay)
+    metrics.song_event(song_key, 'downloaded')
+    
+    # Read the exact lengths from the MP3 headers now, so later stages never decode just to learn them
+    await asyncio.to_thread(record_durations, file_paths)
+    
+    song_info = []
+    for i, variant in enumerate(['A', 'B']):
+        song_info.append({
+            'title': f"{title} (Variation {variant})",
+            'file_path': file_paths[i],
+            'id': audio_info[i]['id']
+        })
+    return song_info
 
-async def generate_single_song(title, prompt, music_folder, session, semaphore):
+async def generate_single_song(title, prompt, music_folder, session, limiter, poller, retry_budget=None,
+                               max_attempts=3, backoff=2.0, song_key=None):
     """
-    Generates a single song with the given prompt using Suno AI
+    Generates a single song with the given prompt using Suno AI, retrying failed attempts with
+    exponential backoff while attempts and the shared retry budget last. Raises the last error otherwise.
     """
-    async with semaphore:
+    prompt_folder = create_folder_for_prompt(prompt, music_folder)
+    retry_budget = retry_budget or RetryBudget()
+    retry_budget.record_attempt()
+    
+    for attempt in range(1, max_attempts + 1):
         try:
-            prompt_folder = create_folder_for_prompt(prompt, music_folder)
-            
-            # Generate the audio
-            response = await generate_audio_by_prompt_async(prompt, session)
-            if not response:
-                return None
-            
-            # The response contains a list of two variations
-            if not isinstance(response, list) or len(response) < 2:
-                print(f"Unexpected response format for prompt: {prompt}")
-                return None
-            
-            ids = f"{response[0]['id']},{response[1]['id']}"
-            print(f"Song IDs: {ids}")
-            
-            # Wait and get the audio information
-            for _ in range(30):  # Maximum 5 minutes wait (10 seconds * 30)
-                audio_info = await get_audio_information_async(ids, session)
-                if audio_info and audio_info[0]["status"] == 'streaming' and audio_info[1]["status"] == 'streaming':
-                    download_tasks = []
-                    for i, variant in enumerate(['A', 'B']):
-                        audio_url = audio_info[i]["audio_url"]
-                        file_path = os.path.join(prompt_folder, f"{audio_info[i]['id']}.mp3")
-                        download_tasks.append(download_audio_file_async(audio_url, file_path, session))
-                    
-                    results = await asyncio.gather(*download_tasks)
-                    if all(results):
-                        song_info = []
-                        for i, variant in enumerate(['A', 'B']):
-                            song_info.append({
-                                'title': f"{title} (Variation {variant})",
-                                'file_path': os.path.join(prompt_folder, f"{audio_info[i]['id']}.mp3"),
-                                'id': audio_info[i]['id']
-                            })
-                        return song_info
-                    break
-                await asyncio.sleep(5)
-            
-            print(f"Timeout waiting for audio generation: {title}")
-            return None
-            
+            return await generate_song_attempt(title, prompt, prompt_folder, session, limiter, poller,
+                                               song_key, backoff=backoff)
         except Exception as e:
-            print(f"Error generating song '{title}': {e}")
-            return None
\ No newline at end of file
+            if attempt == max_attempts or not retry_budget.try_spend():
+                raise
+            delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            print(f"Attempt {attempt}/{max_attempts} for '{title}' failed: {e}. Retrying in {delay:.1f}s")
+            get_metrics().increment('suno_retries')
+            await asyncio.sleep(delay)
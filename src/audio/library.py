@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from ..utils.library import SqliteLibrary
+
+def normalize_prompt(prompt):
+    """
+    Collapses case and whitespace so trivially different spellings of a prompt share a cache entry
+    """
+    return " ".join(prompt.lower().split())
+
+def link_or_copy(source, destination):
+    """
+    Hard-links a file when source and destination share a filesystem, copying it otherwise
+    """
+    if os.path.exists(destination):
+        return
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+class SongLibrary(SqliteLibrary):
+    """
+    Cross-run library of generated songs, indexed in SQLite by prompt hash and generation parameters.
+    Audio files live under Output/.cache/songs and are evicted least recently used first once max_bytes is exceeded.
+    """
+    table = "songs"
+    schema = """
+        CREATE TABLE IF NOT EXISTS songs (
+            key TEXT PRIMARY KEY,
+            prompt TEXT NOT NULL,
+            variations TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """
+
+    def __init__(self, max_bytes=20 * 1024 ** 3):
+        super().__init__("songs", max_bytes)
+
+    @staticmethod
+    def make_key(prompt, params):
+        payload = json.dumps({'prompt': normalize_prompt(prompt), 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, prompt, params):
+        """
+        Returns the cached variations as a list of {'id', 'file_path'} dicts, or None on a miss
+        """
+        key = self.make_key(prompt, params)
+        row = self.db.execute("SELECT variations FROM songs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        variations = json.loads(row[0])
+        if not all(os.path.exists(variation['file_path']) for variation in variations):
+            self._delete(key)
+            return None
+
+        self.db.execute("UPDATE songs SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        return variations
+
+    def restore(self, title, prompt, params, prompt_folder):
+        """
+        Places cached variations of a prompt into this run's prompt folder.
+        Returns song_info entries in the same shape generate_single_song produces, or None on a miss.
+        """
+        variations = self.lookup(prompt, params)
+        if variations is None:
+            return None
+
+        song_info = []
+        for variant, variation in zip(['A', 'B'], variations):
+            file_path = os.path.join(prompt_folder, f"{variation['id']}.mp3")
+            link_or_copy(variation['file_path'], file_path)
+            song_info.append({
+                'title': f"{title} (Variation {variant})",
+                'file_path': file_path,
+                'id': variation['id']
+            })
+        return song_info
+
+    def sample(self, limit, params, music_folder, exclude_prompts=()):
+        """
+        Draws up to `limit` random prompts from the library and places their variations in music_folder,
+        so a mix can be packed from the cached pool rather than only this run's prompts.
+        Returns a list of song_info lists.
+        """
+        excluded = {self.make_key(prompt, params) for prompt in exclude_prompts}
+        rows = self.db.execute("SELECT key, prompt FROM songs ORDER BY RANDOM()").fetchall()
+
+        pool = []
+        for key, prompt in rows:
+            if len(pool) >= limit:
+                break
+            if key in excluded:
+                continue
+            variations = self.lookup(prompt, params)
+            if variations is None:
+                continue
+            prompt_folder = os.path.join(music_folder, "library", key[:16])
+            os.makedirs(prompt_folder, exist_ok=True)
+            song_info = []
+            for variant, variation in zip(['A', 'B'], variations):
+                file_path = os.path.join(prompt_folder, f"{variation['id']}.mp3")
+                link_or_copy(variation['file_path'], file_path)
+                song_info.append({
+                    'title': variation.get('title') or f"{prompt[:40]} (Variation {variant})",
+                    'file_path': file_path,
+                    'id': variation['id']
+                })
+            pool.append(song_info)
+        return pool
+
+    def add(self, prompt, params, song_info):
+        """
+        Stores freshly generated variations in the library, then evicts if it has grown past max_bytes
+        """
+        key = self.make_key(prompt, params)
+        entry_folder = os.path.join(self.folder, key[:2], key)
+        os.makedirs(entry_folder, exist_ok=True)
+
+        variations = []
+        size = 0
+        for song in song_info:
+            file_path = os.path.join(entry_folder, os.path.basename(song['file_path']))
+            link_or_copy(song['file_path'], file_path)
+            size += os.path.getsize(file_path)
+            variations.append({'id': song['id'], 'file_path': file_path, 'title': song['title']})
+
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO songs (key, prompt, variations, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, prompt, json.dumps(variations), size, now, now)
+        )
+        self.db.commit()
+        self.evict()
+
+    def _remove_files(self, key):
+        shutil.rmtree(os.path.join(self.folder, key[:2], key), ignore_errors=True)
@@ -0,0 +1,86 @@
+import numpy as np
+from scipy.signal import lfilter, resample_poly
+
+BLOCK_SECONDS = 0.4
+BLOCK_OVERLAP = 0.75
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_CHUNK = 1 << 18
+TRUE_PEAK_PAD = 64
+
+def k_weighting_filters(frame_rate):
+    """
+    Returns the two ITU-R BS.1770 K-weighting biquads (high shelf, then RLB high-pass) for the given sample rate
+    """
+    # High shelf modelling the acoustic effect of the head
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / frame_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # Revised low-frequency B-curve high-pass
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / frame_rate)
+    a0 = 1 + k / q + k * k
+    highpass_b = [1.0, -2.0, 1.0]
+    highpass_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    return (shelf_b, shelf_a), (highpass_b, highpass_a)
+
+def integrated_loudness(samples, frame_rate):
+    """
+    Gated integrated loudness in LUFS of a float sample array shaped (frames, channels)
+    """
+    (shelf_b, shelf_a), (highpass_b, highpass_a) = k_weighting_filters(frame_rate)
+    weighted = lfilter(highpass_b, highpass_a, lfilter(shelf_b, shelf_a, samples, axis=0), axis=0)
+
+    block = int(BLOCK_SECONDS * frame_rate)
+    step = int(block * (1 - BLOCK_OVERLAP))
+    if len(weighted) < block:
+        return float('-inf')
+
+    # Mean square of every 400 ms block, for all blocks at once, from a running sum of energy
+    energy = np.concatenate([np.zeros((1, weighted.shape[1])), np.cumsum(weighted ** 2, axis=0)])
+    starts = np.arange(0, len(weighted) - block + 1, step)
+    block_power = ((energy[starts + block] - energy[starts]) / block).sum(axis=1)
+
+    with np.errstate(divide='ignore'):
+        block_loudness = -0.691 + 10 * np.log10(block_power)
+
+    gated = block_power[block_loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return float('-inf')
+    relative_threshold = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = block_power[(block_loudness > ABSOLUTE_GATE) & (block_loudness > relative_threshold)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+def true_peak(samples):
+    """
+    Estimated true peak in dBTP using 4x polyphase oversampling, processed in chunks to bound memory
+    """
+    peak = 0.0
+    for start in range(0, len(samples), TRUE_PEAK_CHUNK):
+        length = min(TRUE_PEAK_CHUNK, len(samples) - start)
+        lo = max(start - TRUE_PEAK_PAD, 0)
+        hi = min(start + length + TRUE_PEAK_PAD, len(samples))
+        upsampled = resample_poly(samples[lo:hi], TRUE_PEAK_OVERSAMPLING, 1, axis=0)
+        # Drop the padding so filter edge effects at chunk boundaries don't count
+        offset = (start - lo) * TRUE_PEAK_OVERSAMPLING
+        inner = upsampled[offset:offset + length * TRUE_PEAK_OVERSAMPLING]
+        peak = max(peak, float(np.abs(inner).max()))
+    return float(20 * np.log10(peak)) if peak > 0 else float('-inf')
+
+def measure_segment(audio):
+    """
+    Measures integrated loudness and true peak of a pydub AudioSegment
+    """
+    scale = float(1 << (8 * audio.sample_width - 1))
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32).reshape(-1, audio.channels) / scale
+    return {
+        'lufs': integrated_loudness(samples, audio.frame_rate),
+        'true_peak': true_peak(samples)
+    }
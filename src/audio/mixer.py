@@ -0,0 +1,111 @@
+import numpy as np
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+CHUNK_MS = 10000
+
+def fade_curves(length, curve="linear"):
+    """
+    Returns matching (fade_in, fade_out) gain arrays of the given length.
+    'equal_power' keeps the summed power constant across a crossfade, 'linear' keeps the summed amplitude constant.
+    """
+    t = (np.arange(length, dtype=np.float32) + 0.5) / max(length, 1)
+    if curve == "equal_power":
+        return np.sin(t * (np.pi / 2)), np.cos(t * (np.pi / 2))
+    if curve == "linear":
+        return t, 1.0 - t
+    raise ValueError(f"Unknown fade curve: {curve}")
+
+class StreamingMixer:
+    """
+    Writes tracks to a PCM sink one at a time so only the current track is held in memory.
+    With crossfade_duration set, the tail of each track is held back and mixed with the head of the next one.
+    """
+    def __init__(self, sink, fade_duration=2000, frame_rate=SAMPLE_RATE, channels=CHANNELS,
+                 crossfade_duration=0, curve="equal_power"):
+        self.sink = sink
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.frame_size = channels * SAMPLE_WIDTH
+        self.fade_frames = self._to_frames(fade_duration)
+        self.crossfade_frames = self._to_frames(crossfade_duration)
+        self.curve = curve
+        self.frames_written = 0
+        self.pending = None
+
+    @property
+    def position(self):
+        """
+        Current end of the mix in milliseconds, including any held-back crossfade tail
+        """
+        pending = len(self.pending) if self.pending is not None else 0
+        return (self.frames_written + pending) * 1000 / self.frame_rate
+
+    def _to_frames(self, duration_ms):
+        return int(duration_ms * self.frame_rate / 1000)
+
+    def _to_samples(self, audio):
+        audio = audio.set_frame_rate(self.frame_rate).set_channels(self.channels).set_sample_width(SAMPLE_WIDTH)
+        return np.frombuffer(audio.raw_data, dtype=np.int16).reshape(-1, self.channels)
+
+    def add(self, audio, gain_db=0.0):
+        """
+        Appends a track, applying gain and fades with NumPy on the fly.
+        Returns the position in milliseconds where the track starts (the beginning of the overlap when crossfading).
+        """
+        samples = self._to_samples(audio)
+        gain = np.float32(10 ** (gain_db / 20))
+        total = len(samples)
+
+        if self.pending is None:
+            overlap = 0
+            head = min(self.fade_frames, total // 2)
+            start = self.frames_written
+            fade_in, _ = fade_curves(head, "linear")
+            self._write(samples[:head] * gain * fade_in[:, None])
+        else:
+            overlap = min(len(self.pending), total // 2)
+            self._write(self.pending[:len(self.pending) - overlap])
+            start = self.frames_written
+            fade_in, fade_out = fade_curves(overlap, self.curve)
+            mixed = self.pending[len(self.pending) - overlap:] * fade_out[:, None]
+            mixed += samples[:overlap] * gain * fade_in[:, None]
+            self._write(mixed)
+            head = overlap
+            self.pending = None
+
+        if self.crossfade_frames:
+            hold = min(self.crossfade_frames, total - head)
+            self._write(samples[head:total - hold], gain)
+            self.pending = samples[total - hold:] * gain
+        else:
+            tail = min(self.fade_frames, total - head)
+            self._write(samples[head:total - tail], gain)
+            _, fade_out = fade_curves(tail, "linear")
+            self._write(samples[total - tail:] * gain * fade_out[:, None])
+
+        return start * 1000 / self.frame_rate
+
+    def _write(self, samples, gain=None):
+        chunk_frames = self.frame_rate * CHUNK_MS // 1000
+        for offset in range(0, len(samples), chunk_frames):
+            chunk = samples[offset:offset + chunk_frames]
+            if gain is not None and gain != 1:
+                chunk = chunk * gain
+            if chunk.dtype != np.int16:
+                chunk = np.clip(chunk, -32768, 32767).astype(np.int16)
+            self.sink.write(chunk.tobytes())
+        self.frames_written += len(samples)
+
+    def close(self):
+        """
+        Fades out any held-back tail and finalizes the sink
+        """
+        if self.pending is not None:
+            tail = min(self.fade_frames, len(self.pending))
+            _, fade_out = fade_curves(tail, "linear")
+            self.pending[len(self.pending) - tail:] *= fade_out[:, None]
+            self._write(self.pending)
+            self.pending = None
+        self.sink.close()
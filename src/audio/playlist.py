@@ -0,0 +1,75 @@
+import random
+from collections import defaultdict
+
+def select_tracks(durations, target_seconds, tolerance=10, overlap_seconds=0, resolution=0.1):
+    """
+    Picks a subset of tracks whose mixed length lands within tolerance of target_seconds.
+    Consecutive tracks overlap by overlap_seconds, so each one effectively contributes (duration - overlap).
+    Solves the subset-sum with a bitset DP (one Python int per track) and returns the chosen indexes,
+    or None if no subset fits.
+    """
+    weights = [max(int(round((duration - overlap_seconds) / resolution)), 1) for duration in durations]
+    target = int(round((target_seconds - overlap_seconds) / resolution))
+    slack = int(round(tolerance / resolution))
+    mask = (1 << (target + slack + 1)) - 1
+
+    # reachable[i] has bit s set when some subset of the first i tracks sums to s
+    reachable = [1]
+    for weight in weights:
+        reachable.append((reachable[-1] | (reachable[-1] << weight)) & mask)
+
+    final = reachable[-1]
+    candidates = [s for s in range(max(target - slack, 1), target + slack + 1) if (final >> s) & 1]
+    if not candidates:
+        return None
+    total = min(candidates, key=lambda s: abs(s - target))
+
+    chosen = []
+    for i in range(len(weights), 0, -1):
+        if (reachable[i - 1] >> total) & 1:
+            continue
+        chosen.append(i - 1)
+        total -= weights[i - 1]
+    return chosen[::-1]
+
+def order_tracks(tracks, group_of, rng=random):
+    """
+    Shuffles tracks so that two tracks from the same group (e.g. the A/B variations of one prompt)
+    are never adjacent, whenever the group sizes make that possible.
+    """
+    groups = defaultdict(list)
+    for track in tracks:
+        groups[group_of(track)].append(track)
+    for members in groups.values():
+        rng.shuffle(members)
+
+    ordered = []
+    previous = None
+    while groups:
+        # Prefer the group with the most tracks left so the large ones don't pile up at the end
+        choices = [group for group in groups if group != previous] or list(groups)
+        most = max(len(groups[group]) for group in choices)
+        group = rng.choice([group for group in choices if len(groups[group]) == most])
+        ordered.append(groups[group].pop())
+        if not groups[group]:
+            del groups[group]
+        previous = group
+    return ordered
+
+def pack_playlist(songs, durations, target_seconds, tolerance=10, overlap_seconds=0, group_of=None, rng=random):
+    """
+    Builds a playlist of songs that mixes to target_seconds (within tolerance) using only known durations.
+    group_of, if given, keeps songs of the same group apart. Returns the ordered songs, or None if no subset fits.
+    """
+    indexes = list(range(len(songs)))
+    # Shuffle first so repeated runs over the same pool pick different subsets
+    rng.shuffle(indexes)
+    chosen = select_tracks([durations[i] for i in indexes], target_seconds, tolerance, overlap_seconds)
+    if chosen is None:
+        return None
+
+    selected = [songs[indexes[i]] for i in chosen]
+    if group_of:
+        return order_tracks(selected, group_of, rng)
+    rng.shuffle(selected)
+    return selected
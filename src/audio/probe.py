@@ -0,0 +1,216 @@
+import os
+import mmap
+import json
+import struct
+import tempfile
+
+# Persisted next to the downloaded variations in each prompt folder
+DURATIONS_FILE = "durations.json"
+
+# Bitrates in kbps by (MPEG-1?, layer) and sample rates by version bits
+BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+def parse_frame_header(data, offset=0):
+    """
+    Decodes the 4-byte MPEG audio frame header at offset.
+    Returns (frame_length, samples_per_frame, sample_rate, channels, side_info_size), or None if it isn't one.
+    """
+    if len(data) < offset + 4:
+        return None
+    header, = struct.unpack_from(">I", data, offset)
+    if header >> 21 != 0x7ff:
+        return None
+    version = (header >> 19) & 3
+    layer = 4 - ((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 15
+    rate_index = (header >> 10) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        # Reserved values, or free-format bitrate which has no fixed frame length
+        return None
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (header >> 9) & 1
+    channels = 1 if (header >> 6) & 3 == 3 else 2
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples_per_frame = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        samples_per_frame = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+
+    if mpeg1:
+        side_info_size = 17 if channels == 1 else 32
+    else:
+        side_info_size = 9 if channels == 1 else 17
+    return frame_length, samples_per_frame, sample_rate, channels, side_info_size
+
+def skip_id3v2(data):
+    """
+    Offset of the first byte after any ID3v2 tag at the start of the file
+    """
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def find_first_frame(data, offset):
+    """
+    Finds the first frame header at or after offset that is followed by another valid header,
+    so a stray 0xFF byte in leftover tag data isn't mistaken for audio
+    """
+    while True:
+        offset = data.find(b"\xff", offset)
+        if offset < 0:
+            return None
+        header = parse_frame_header(data, offset)
+        if header:
+            following = offset + header[0]
+            if following + 4 > len(data) or parse_frame_header(data, following):
+                return offset, header
+        offset += 1
+
+def read_info_header(data, offset, header):
+    """
+    Reads the frame count and gapless encoder delay/padding from a Xing/Info (with LAME extension) or VBRI
+    header in the first frame. Returns (frames, delay, padding, source), or None when there is no such header.
+    frames is None for a Xing/Info header without a frame count; the header frame itself carries no audio
+    and is never included in frames.
+    """
+    frame_length, samples_per_frame, _, _, side_info_size = header
+    xing = offset + 4 + side_info_size
+    tag = data[xing:xing + 4]
+    if tag in (b"Xing", b"Info") and xing + 8 <= len(data):
+        flags, = struct.unpack_from(">I", data, xing + 4)
+        frames = None
+        if flags & 1 and xing + 12 <= len(data):
+            frames, = struct.unpack_from(">I", data, xing + 8)
+        lame = xing + 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+        delay = padding = 0
+        if data[lame:lame + 4] in (b"LAME", b"Lavc", b"Lavf") and lame + 24 <= min(offset + frame_length, len(data)):
+            packed = int.from_bytes(data[lame + 21:lame + 24], "big")
+            delay, padding = packed >> 12, packed & 0xfff
+        return frames, delay, padding, tag.decode().lower()
+
+    vbri = offset + 4 + 32
+    if data[vbri:vbri + 4] == b"VBRI" and vbri + 18 <= len(data):
+        delay, = struct.unpack_from(">H", data, vbri + 6)
+        frames, = struct.unpack_from(">I", data, vbri + 14)
+        return frames, delay, 0, "vbri"
+    return None
+
+def count_frames(data, offset, end):
+    """
+    Walks the frame headers from offset to end and returns the number of audio frames,
+    resynchronizing on the next valid header after any corrupt stretch
+    """
+    frames = 0
+    while offset + 4 <= end:
+        header = parse_frame_header(data, offset)
+        if header is None or offset + header[0] > end:
+            found = find_first_frame(data, offset + 1)
+            if found is None or found[0] >= end:
+                break
+            offset = found[0]
+            continue
+        frames += 1
+        offset += header[0]
+    return frames
+
+def probe_mp3(file_path):
+    """
+    Reads an MP3's exact length from its headers, without decoding any audio.
+    Uses the Xing/Info or VBRI header when the encoder wrote one (trimming the LAME encoder delay and
+    padding like ffmpeg does), and otherwise walks every frame header over a memory-mapped file.
+    Returns a dict with duration (seconds), samples, sample_rate, channels, frames and source.
+    Raises ValueError if no MPEG audio frames are found.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{file_path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            found = find_first_frame(data, skip_id3v2(data))
+            if found is None:
+                raise ValueError(f"No MPEG audio frames found in {file_path}")
+            offset, header = found
+            frame_length, samples_per_frame, sample_rate, channels, _ = header
+
+            try:
+                info = read_info_header(data, offset, header)
+                if info and info[0] is not None:
+                    frames, delay, padding, source = info
+                else:
+                    # Leave a trailing ID3v1 tag out of the walk, and a Xing/Info frame without a count too
+                    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+                    start = offset + frame_length if info else offset
+                    delay, padding = info[1:3] if info else (0, 0)
+                    frames, source = count_frames(data, start, end), "frames"
+            except struct.error as e:
+                raise ValueError(f"Truncated MP3 header in {file_path}: {e}") from e
+
+    samples = max(frames * samples_per_frame - delay - padding, 0)
+    return {
+        'duration': samples / sample_rate,
+        'samples': samples,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'frames': frames,
+        'source': source
+    }
+
+def load_durations(folder):
+    try:
+        with open(os.path.join(folder, DURATIONS_FILE), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def record_durations(file_paths):
+    """
+    Probes each file and merges the results into the durations.json of its folder.
+    Returns the probe results keyed by file path; files that can't be probed are left out.
+    """
+    probes = {}
+    by_folder = {}
+    for file_path in file_paths:
+        try:
+            probe = {**probe_mp3(file_path), 'size': os.path.getsize(file_path)}
+        except (OSError, ValueError) as e:
+            print(f"Could not read the length of {file_path}: {e}")
+            continue
+        probes[file_path] = probe
+        by_folder.setdefault(os.path.dirname(file_path), {})[os.path.basename(file_path)] = probe
+
+    for folder, entries in by_folder.items():
+        durations = {**load_durations(folder), **entries}
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(durations, f, indent=2)
+        os.replace(tmp_path, os.path.join(folder, DURATIONS_FILE))
+    return probes
+
+def get_duration(file_path):
+    """
+    Length of an MP3 in seconds, from its folder's durations.json when the file is unchanged,
+    probing the headers otherwise
+    """
+    entry = load_durations(os.path.dirname(file_path)).get(os.path.basename(file_path))
+    if entry and entry.get('size') == os.path.getsize(file_path):
+        return entry['duration']
+    return probe_mp3(file_path)['duration']
@@ -1,63 +1,240 @@
 import random
+import asyncio
 from pydub import AudioSegment
 import os
+from concurrent.futures import ProcessPoolExecutor
+from .mixer import StreamingMixer, SAMPLE_RATE, CHANNELS
+from .loudness import measure_segment
+from .playlist import pack_playlist
+from .probe import get_duration
+from ..utils.ffmpeg import open_mp3_sink
+from ..utils.cache import JsonCache
+from ..utils.file_manager import hash_file
 
-def concatenate_audio_files(all_songs, music_folder, fade_duration=2000, target_dbfs=-14):
+# Bump when the analysis output changes so stale cache entries are ignored
+ANALYSIS_VERSION = 2
+ANALYSIS_CACHE = "analysis"
+
+# Tracks shorter than this (seconds) are left out of the mix
+MIN_DURATION = 60
+
+def format_timestamp(position_ms):
+    """
+    Formats a playlist position as MM:SS, or H:MM:SS once past the first hour
+    """
+    total_seconds = position_ms / 1000
+    hours = int(total_seconds // 3600)
+    minutes = int((total_seconds % 3600) // 60)
+    seconds = int(total_seconds % 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours > 0 else f"{minutes:02d}:{seconds:02d}"
+
+def analyze_track(file_path):
+    """
+    Measures a track's duration, integrated loudness and true peak (runs in a worker process).
+    The duration comes from the MP3 headers, so tracks too short to be mixed are never decoded at all.
+    Results are cached by file content hash, so a segment reused in a later mix is never decoded for analysis again.
+    """
+    duration = get_duration(file_path)
+    if duration < MIN_DURATION:
+        return {'duration': duration}
+
+    cache = JsonCache(ANALYSIS_CACHE)
+    key = f"{hash_file(file_path)}_v{ANALYSIS_VERSION}"
+    analysis = cache.get(key)
+    if analysis is not None:
+        return analysis
+
+    audio = AudioSegment.from_mp3(file_path)
+    analysis = {
+        'duration': duration,
+        **measure_segment(audio)
+    }
+    cache.put(key, analysis)
+    return analysis
+
+def analyze_tracks(all_songs, max_workers=None, cache_bytes=16 * 1024 * 1024):
+    """
+    Analyzes every song in parallel across a process pool.
+    Returns one analysis dict per song in the same order, or None where the file could not be decoded.
+    """
+    analyses = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(analyze_track, song['file_path']) for song in all_songs]
+        for song, future in zip(all_songs, futures):
+            try:
+                analyses.append(future.result())
+            except Exception as e:
+                print(f"Error loading file {song['file_path']}: {e}")
+                analyses.append(None)
+
+    JsonCache(ANALYSIS_CACHE, cache_bytes).evict()
+    return analyses
+
+async def analyze_songs_async(song_stream, max_workers=None, cache_bytes=16 * 1024 * 1024, executor=None):
+    """
+    Consumes an async iterator of song_info lists (see iter_songs_async) and analyzes each file
+    in the process pool as soon as it arrives, overlapping analysis with the remaining generations.
+    Pass a shared executor to bound CPU use across several concurrent runs.
+    Returns the flattened song list and a dict of analyses keyed by file path.
+    """
+    loop = asyncio.get_running_loop()
+    all_songs = []
+    futures = []
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        async for song_info in song_stream:
+            for song in song_info:
+                all_songs.append(song)
+                futures.append(loop.run_in_executor(executor, analyze_track, song['file_path']))
+
+        analyses = {}
+        for song, result in zip(all_songs, await asyncio.gather(*futures, return_exceptions=True)):
+            if isinstance(result, Exception):
+                print(f"Error loading file {song['file_path']}: {result}")
+                result = None
+            analyses[song['file_path']] = result
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    JsonCache(ANALYSIS_CACHE, cache_bytes).evict()
+    return all_songs, analyses
+
+def normalization_gain(analysis, target_lufs, max_true_peak):
+    """
+    Gain in dB that brings a track to target_lufs without pushing its true peak above max_true_peak
+    """
+    if analysis['lufs'] == float('-inf'):
+        return 0.0
+    gain_db = target_lufs - analysis['lufs']
+    return min(gain_db, max_true_peak - analysis['true_peak'])
+
+def plan_playlist(all_songs, analyses, target_duration, tolerance=10, overlap_seconds=0):
     """
-    Combines multiple audio files into a single playlist with fade effects and volume normalization
+    Chooses and orders songs so the mix lands within tolerance of target_duration seconds,
+    using only the analyzed durations and keeping the A/B variations of one prompt apart.
+    Returns the (songs, analyses) to mix, or None if no combination of songs fits.
+    """
+    usable = [(song, analysis) for song, analysis in zip(all_songs, analyses)
+              if analysis is not None and analysis['duration'] >= MIN_DURATION]
+    playlist = pack_playlist(
+        usable, [analysis['duration'] for _, analysis in usable], target_duration, tolerance, overlap_seconds,
+        group_of=lambda entry: os.path.dirname(entry[0]['file_path'])
+    )
+    if playlist is None:
+        return None
+    return [song for song, _ in playlist], [analysis for _, analysis in playlist]
+
+def order_playlist(all_songs, analyses, target_duration=None, duration_tolerance=10, overlap_seconds=0):
+    """
+    Chooses the order songs are mixed in: packed to target_duration seconds when set and some combination fits
+    (see plan_playlist), otherwise every song shuffled. analyses is one analysis per song, in the same order.
+    Songs that couldn't be analyzed or are too short are left out, so the result is exactly what gets mixed.
+    Returns the ordered (songs, analyses).
+    """
+    entries = []
+    for song, analysis in zip(all_songs, analyses):
+        if analysis is None:
+            continue
+        if analysis['duration'] < MIN_DURATION:
+            print(f"Skipping {song['title']} - Duration too short ({analysis['duration']:.1f} seconds)")
+            continue
+        entries.append((song, analysis))
+    random.shuffle(entries)
+    all_songs = [song for song, _ in entries]
+    analyses = [analysis for _, analysis in entries]
+
+    if target_duration:
+        plan = plan_playlist(all_songs, analyses, target_duration, duration_tolerance, overlap_seconds)
+        if plan:
+            print(f"Packed {len(plan[0])} songs to {target_duration / 60:.1f} minutes")
+            return plan
+        print(f"No combination of songs fits {target_duration / 60:.1f} minutes, using all songs in random order")
+    else:
+        print("Using all songs in random order")
+    return all_songs, analyses
+
+def concatenate_audio_files(all_songs, music_folder, fade_duration=2000, target_lufs=-14, max_true_peak=-1.0,
+                            crossfade_duration=0, crossfade_curve="equal_power", analysis_workers=None, sink=None,
+                            analyses=None, target_duration=None, duration_tolerance=10, ordered=False):
+    """
+    Combines multiple audio files into a single playlist with fade effects and EBU R128 loudness normalization.
+    Tracks are decoded one at a time and streamed to the encoder, so memory stays bounded by a single track.
+    With crossfade_duration (ms) set, consecutive tracks overlap by that window instead of fading to silence.
+    Durations and loudness are measured up front by a pool of analysis_workers processes (default: one per CPU),
+    unless precomputed analyses keyed by file path are passed in (see analyze_songs_async).
+    With target_duration (seconds) set, the songs are packed to hit that length within duration_tolerance
+    instead of shuffling everything in (see order_playlist). With ordered set, all_songs is mixed as given instead,
+    e.g. a playlist order_playlist chose earlier, so separate mixes of it get the same timestamps.
+    By default the mix is encoded to combined_playlist.mp3; pass a PCM sink (e.g. a video muxer) to stream it elsewhere.
+    Returns the standalone audio path (None if the sink writes none) and the timestamps.
     """
-    combined_audio = AudioSegment.empty()
-    current_position = 0
     timestamps = []
-    
-    random.shuffle(all_songs)
-    
-    print("\nAdding songs in random order:")
-    for i, song in enumerate(all_songs, 1):
-        try:
-            audio = AudioSegment.from_mp3(song['file_path'])
-            
-            duration_seconds = len(audio) / 1000
-            if duration_seconds < 60:
+
+    if sink is None:
+        sink = open_mp3_sink(os.path.join(music_folder, "combined_playlist.mp3"), SAMPLE_RATE, CHANNELS)
+    output_audio_path = sink.audio_path
+    mixer = StreamingMixer(
+        sink, fade_duration, frame_rate=sink.frame_rate, channels=sink.channels,
+        crossfade_duration=crossfade_duration, curve=crossfade_curve
+    )
+
+    all_songs = list(all_songs)
+
+    try:
+        if analyses is None:
+            analyses = analyze_tracks(all_songs, analysis_workers)
+        else:
+            analyses = [analyses.get(song['file_path']) for song in all_songs]
+
+        if not ordered:
+            all_songs, analyses = order_playlist(all_songs, analyses, target_duration, duration_tolerance,
+                                                 crossfade_duration / 1000)
+
+        print("\nAdding songs:")
+        for i, (song, analysis) in enumerate(zip(all_songs, analyses), 1):
+            if analysis is None:
+                continue
+            duration_seconds = analysis['duration']
+            if duration_seconds < MIN_DURATION:
                 print(f"Skipping {song['title']} - Duration too short ({duration_seconds:.1f} seconds)")
                 continue
-            
-            # Normalize audio levels
-            current_dbfs = audio.dBFS
-            change_in_dbfs = target_dbfs - current_dbfs
-            
-            # Only adjust if the difference is significant (more than 2dB)
-            if abs(change_in_dbfs) > 2:
-                audio = audio.apply_gain(change_in_dbfs)
-                print(f"Normalized {song['title']} from {current_dbfs:.1f} dBFS to {audio.dBFS:.1f} dBFS")
-            
-            # Apply fade effects
-            audio = audio.fade_in(fade_duration).fade_out(fade_duration)
-            
-            combined_audio += audio
-            
-            total_seconds = current_position / 1000
-            hours = int(total_seconds // 3600)
-            minutes = int((total_seconds % 3600) // 60)
-            seconds = int(total_seconds % 60)
-            
-            timestamp = f"{hours}:{minutes:02d}:{seconds:02d}" if hours > 0 else f"{minutes:02d}:{seconds:02d}"
-            
+
+            # Only a decode error skips the song; a failing sink aborts the whole mix below
+            try:
+                audio = AudioSegment.from_mp3(song['file_path'])
+            except Exception as e:
+                print(f"Error loading file {song['file_path']}: {e}")
+                continue
+
+            # Normalize integrated loudness, limited by true peak headroom
+            gain_db = normalization_gain(analysis, target_lufs, max_true_peak)
+
+            # Only adjust if the difference is significant (more than 0.5 dB)
+            if abs(gain_db) > 0.5:
+                print(f"Normalized {song['title']} from {analysis['lufs']:.1f} LUFS to {analysis['lufs'] + gain_db:.1f} LUFS")
+            else:
+                gain_db = 0.0
+
+            timestamp = format_timestamp(mixer.add(audio, gain_db))
+            del audio
+
             timestamps.append({
                 'title': song['title'],
                 'timestamp': timestamp
             })
-            
-            current_position += len(audio)
+
             print(f"{i}. Added {song['title']} - Position: {timestamp} - Duration: {duration_seconds:.1f}s")
-            
-        except Exception as e:
-            print(f"Error loading file {song['file_path']}: {e}")
-
-    output_audio_path = os.path.join(music_folder, "combined_playlist.mp3")
-    combined_audio.export(output_audio_path, format="mp3")
-    
-    print(f"\nCombined audio saved as {output_audio_path}")
-    print(f"Final playlist duration: {len(combined_audio)/1000/60:.2f} minutes")
+    except BaseException:
+        mixer.sink.abort()
+        raise
+
+    mixer.close()
+
+    if output_audio_path:
+        print(f"\nCombined audio saved as {output_audio_path}")
+    print(f"Final playlist duration: {mixer.position/1000/60:.2f} minutes")
     print(f"Total songs added: {len(timestamps)}")
-    return output_audio_path, timestamps
\ No newline at end of file
+    return output_audio_path, timestamps
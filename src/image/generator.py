@@ -1,21 +1,33 @@
 import os
+import time
 import random
 import requests
+from collections import Counter
 from ..config import OPENAI_API_KEY
-import time
+from .library import ImageLibrary
+from .variants import render_variant
+
+OPENAI_IMAGES_URL = "https://api.openai.com/v1/images/generations"
+DEFAULT_BACKGROUND = "assets/default_background.jpg"
 
-def generate_background_image(prompts, photos_folder, max_retries=3):
+def build_image_prompt(prompts):
     """
-    Generates background image using song prompts as inspiration while maintaining cosmic café theme
+    Assembles the DALL-E prompt from the song prompts' mood words and random café and cosmic elements.
+    The random choices are seeded from the mood words and the sorted song prompts, so the same set of
+    song prompts always gives the same image prompt (which is what the 'exact' reuse policy matches on).
+    Returns the prompt and the set of (up to three) mood words it was built around.
     """
-    # Extract mood and atmospheric words from the prompts
-    mood_words = set()
+    # Extract mood and atmospheric words from the prompts, keeping the most common ones
+    mood_counts = Counter()
     for title, prompt in prompts:
         words = prompt.lower().split()
-        mood_words.update(word for word in words if word in {
+        mood_counts.update(word for word in words if word in {
             'mellow', 'warm', 'soft', 'gentle', 'relaxed', 'smooth', 'dreamy',
             'ambient', 'calm', 'serene', 'peaceful', 'tranquil', 'soothing'
         })
+    # Ties are broken alphabetically so the song prompts' order doesn't change which words are kept
+    mood_words = sorted(word for word, _ in sorted(mood_counts.items(), key=lambda item: (-item[1], item[0]))[:3])
+    rng = random.Random("\n".join(mood_words + sorted(prompt for _, prompt in prompts)))
     
     base_elements = [
         "cozy café interior",
@@ -24,7 +36,7 @@ def generate_background_image(prompts, photos_folder, max_retries=3):
     ]
     
     if mood_words:
-        mood_description = f"with {', '.join(list(mood_words)[:3])} atmosphere"
+        mood_description = f"with {', '.join(mood_words)} atmosphere"
         base_elements.append(mood_description)
     
     cosmic_elements = [
@@ -53,10 +65,10 @@ def generate_background_image(prompts, photos_folder, max_retries=3):
         "vintage jazz posters"
     ]
     
-    selected_cosmic = random.sample(cosmic_elements, 2)
-    selected_cafe = random.sample(cafe_elements, 2)
+    selected_cosmic = rng.sample(cosmic_elements, 2)
+    selected_cafe = rng.sample(cafe_elements, 2)
     elements = base_elements + selected_cosmic + selected_cafe
-    sample_prompt = random.choice(prompts)[1]
+    sample_prompt = rng.choice(sorted(prompt for _, prompt in prompts))
     
     image_prompt = (
         f"Create a dreamy lofi café scene with cosmic elements: {', '.join(elements)}. "
@@ -66,7 +78,13 @@ def generate_background_image(prompts, photos_folder, max_retries=3):
         "4K quality, detailed, atmospheric, perfect for lofi music background. "
         "Style similar to Studio Ghibli meets cosmic art."
     )
-    
+    return image_prompt, set(mood_words)
+
+def request_image(image_prompt, output_path, max_retries=3, backoff=2.0):
+    """
+    Generates an image with DALL-E 3 and streams it to output_path, retrying with exponential backoff.
+    Returns whether it succeeded; output_path only exists once an image has downloaded completely.
+    """
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {OPENAI_API_KEY}"
@@ -80,38 +98,71 @@ def generate_background_image(prompts, photos_folder, max_retries=3):
         "quality": "hd"
     }
     
+    part_path = f"{output_path}.part"
     for attempt in range(max_retries):
         try:
-            response = requests.post(
-                "https://api.openai.com/v1/images/generations",
-                headers=headers,
-                json=payload
-            )
+            response = requests.post(OPENAI_IMAGES_URL, headers=headers, json=payload, timeout=120)
             response.raise_for_status()
-            
             image_url = response.json()['data'][0]['url']
-            image_path = os.path.join(photos_folder, "background.jpg")
             
-            img_response = requests.get(image_url)
-            if img_response.status_code == 200:
-                with open(image_path, 'wb') as f:
-                    f.write(img_response.content)
-                print(f"Background image generated and saved as {image_path}")
-                return image_path
-            else:
-                print(f"Failed to download the generated image on attempt {attempt + 1}")
+            # Downloaded through a .part file so a failed download never leaves a partial image behind
+            with requests.get(image_url, stream=True, timeout=60) as img_response:
+                img_response.raise_for_status()
+                with open(part_path, 'wb') as f:
+                    for chunk in img_response.iter_content(chunk_size=256 * 1024):
+                        f.write(chunk)
+            os.replace(part_path, output_path)
+            return True
                 
         except Exception as e:
+            if os.path.exists(part_path):
+                os.remove(part_path)
             print(f"Error generating image on attempt {attempt + 1}: {e}")
             if attempt < max_retries - 1:
-                time.sleep(5)
+                time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+    return False
+
+def find_base_image(prompts, max_retries=3, reuse='mood'):
+    """
+    Returns the base image for a run's song prompts: a cached one from the image library when the reuse policy
+    allows it (see library.REUSE_POLICIES), so DALL-E is only called for new moods, or else a newly generated one,
+    falling back to the default background.
+    """
+    image_prompt, mood_words = build_image_prompt(prompts)
     
-    default_image_path = "assets/default_background.jpg"
-    if os.path.exists(default_image_path):
-        print("Using default background image")
-        import shutil
-        backup_path = os.path.join(photos_folder, "background.jpg")
-        shutil.copy2(default_image_path, backup_path)
-        return backup_path
-    else:
-        raise FileNotFoundError("No default background image found and failed to generate new one")
\ No newline at end of file
+    library = ImageLibrary()
+    try:
+        base_path = library.find(image_prompt, mood_words, reuse)
+        if base_path:
+            print(f"Reusing cached background image: {base_path}")
+        else:
+            base_path = library.path_for(image_prompt)
+            if request_image(image_prompt, base_path, max_retries):
+                library.add(image_prompt, mood_words, base_path)
+                print("Background image generated")
+            elif os.path.exists(DEFAULT_BACKGROUND):
+                print("Using default background image")
+                base_path = DEFAULT_BACKGROUND
+            else:
+                raise FileNotFoundError("No default background image found and failed to generate new one")
+    finally:
+        library.close()
+    return base_path
+
+def render_background(base_path, photos_folder, title=None, tracklist=()):
+    """
+    Renders this run's frame as a fresh local variant of the base image, with the title and the track list
+    (song titles in the order they play) overlaid
+    """
+    image_path = os.path.join(photos_folder, "background.jpg")
+    render_variant(base_path, image_path, title, tracklist)
+    print(f"Background image saved as {image_path}")
+    return image_path
+
+def generate_background_image(prompts, photos_folder, max_retries=3, title=None, reuse='mood', tracklist=()):
+    """
+    Generates background image using song prompts as inspiration while maintaining cosmic café theme.
+    Finds or generates the base image (see find_base_image) and renders the run's variant of it in one go.
+    """
+    base_path = find_base_image(prompts, max_retries, reuse)
+    return render_background(base_path, photos_folder, title, tracklist)
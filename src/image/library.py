@@ -0,0 +1,100 @@
+import os
+import time
+import hashlib
+from ..utils.library import SqliteLibrary
+
+# How generate_background_image may reuse a cached base image instead of calling DALL-E:
+#   exact  - only one generated for the same image prompt, i.e. for the same set of song prompts
+#            (build_image_prompt derives it deterministically from them, whatever their order)
+#   mood   - any generated for the same set of mood words (default)
+#   any    - any cached base image
+#   never  - always generate a new one
+REUSE_POLICIES = ('exact', 'mood', 'any', 'never')
+
+def mood_key(mood_words):
+    return ",".join(sorted(mood_words))
+
+class ImageLibrary(SqliteLibrary):
+    """
+    Cross-run library of DALL-E base images, indexed in SQLite by image prompt and mood set.
+    Each base is reused up to max_uses times (every run renders its own variant on top of it), and files
+    under Output/.cache/images are evicted least recently used first once max_bytes is exceeded.
+    """
+    table = "images"
+    schema = """
+        CREATE TABLE IF NOT EXISTS images (
+            key TEXT PRIMARY KEY,
+            image_prompt TEXT NOT NULL,
+            moods TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            uses INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """
+
+    def __init__(self, max_uses=10, max_bytes=2 * 1024 ** 3):
+        super().__init__("images", max_bytes)
+        self.max_uses = max_uses
+
+    @staticmethod
+    def make_key(image_prompt):
+        return hashlib.sha256(image_prompt.encode()).hexdigest()
+
+    def path_for(self, image_prompt, extension=".png"):
+        """
+        Where a newly generated base image for image_prompt should be written before calling add()
+        """
+        key = self.make_key(image_prompt)
+        os.makedirs(os.path.join(self.folder, key[:2]), exist_ok=True)
+        return os.path.join(self.folder, key[:2], f"{key}{extension}")
+
+    def find(self, image_prompt, mood_words, policy='mood'):
+        """
+        Returns the path of a cached base image allowed by policy, preferring the least used one, or None.
+        A hit counts as a use.
+        """
+        if policy not in REUSE_POLICIES:
+            raise ValueError(f"Unknown image reuse policy '{policy}', expected one of {', '.join(REUSE_POLICIES)}")
+        if policy == 'never':
+            return None
+
+        query = "SELECT key, file_path FROM images WHERE uses < ?"
+        args = [self.max_uses]
+        if policy == 'exact':
+            query += " AND key = ?"
+            args.append(self.make_key(image_prompt))
+        elif policy == 'mood':
+            query += " AND moods = ?"
+            args.append(mood_key(mood_words))
+        query += " ORDER BY uses, RANDOM()"
+
+        for key, file_path in self.db.execute(query, args).fetchall():
+            if not os.path.exists(file_path):
+                self._delete(key)
+                continue
+            self.db.execute("UPDATE images SET uses = uses + 1, last_used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return file_path
+        return None
+
+    def add(self, image_prompt, mood_words, file_path):
+        """
+        Records a freshly generated base image (already at path_for(image_prompt)) as used once,
+        then evicts if the library has grown past max_bytes
+        """
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO images (key, image_prompt, moods, file_path, size, uses, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+            (self.make_key(image_prompt), image_prompt, mood_key(mood_words), file_path,
+             os.path.getsize(file_path), now, now)
+        )
+        self.db.commit()
+        self.evict()
+
+    def _remove_files(self, key):
+        row = self.db.execute("SELECT file_path FROM images WHERE key = ?", (key,)).fetchone()
+        if row and os.path.exists(row[0]):
+            os.remove(row[0])
@@ -0,0 +1,114 @@
+import random
+import textwrap
+import functools
+import numpy as np
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+FRAME_SIZE = (1920, 1080)
+
+# Font files tried for the overlay text before Pillow's bundled default
+FONT_CANDIDATES = ["DejaVuSans-Bold.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", "Arial Bold.ttf", "arialbd.ttf"]
+
+@functools.lru_cache(maxsize=None)
+def load_font(size):
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+def random_crop(image, rng, size=FRAME_SIZE, min_scale=0.8):
+    """
+    Crops a random region with the frame's aspect ratio, covering at least min_scale of the largest such region
+    """
+    aspect = size[0] / size[1]
+    width, height = image.size
+    max_width = min(width, height * aspect)
+    crop_width = max_width * rng.uniform(min_scale, 1.0)
+    crop_height = crop_width / aspect
+    left = rng.uniform(0, width - crop_width)
+    top = rng.uniform(0, height - crop_height)
+    return image.resize(size, Image.BILINEAR, box=(left, top, left + crop_width, top + crop_height))
+
+@functools.lru_cache(maxsize=4)
+def vignette_mask(size, strength=0.35):
+    """
+    RGB multiplier image darkening towards the corners, computed once per frame size
+    """
+    width, height = size
+    y = np.linspace(-1.0, 1.0, height, dtype=np.float32)[:, None]
+    x = np.linspace(-1.0, 1.0, width, dtype=np.float32)[None, :]
+    falloff = 1.0 - strength * np.clip((x * x + y * y) / 2.0, 0.0, 1.0)
+    mask = Image.fromarray((falloff * 255.0 + 0.5).astype(np.uint8), "L")
+    return Image.merge("RGB", (mask, mask, mask))
+
+def color_grade(image, rng):
+    """
+    Applies a random warm/cool tint, contrast and gamma tweak through per-channel lookup tables, plus a vignette
+    """
+    tint = 1.0 + np.array([rng.uniform(-0.08, 0.08), rng.uniform(-0.04, 0.04), rng.uniform(-0.08, 0.08)], dtype=np.float32)
+    contrast = rng.uniform(0.9, 1.15)
+    gamma = rng.uniform(0.85, 1.15)
+
+    levels = np.arange(256, dtype=np.float32)[None, :] / 255.0
+    curves = np.clip((levels * tint[:, None] - 0.5) * contrast + 0.5, 0.0, 1.0) ** gamma
+    table = (curves * 255.0 + 0.5).astype(np.uint8).ravel().tolist()
+
+    return ImageChops.multiply(image.point(table), vignette_mask(image.size))
+
+def fit_title(draw, title, max_width, sizes=(56, 48, 40)):
+    """
+    Picks the largest font size the title fits in on one line, wrapping it at the smallest size otherwise
+    """
+    for size in sizes:
+        font = load_font(size)
+        if draw.textlength(title, font=font) <= max_width:
+            return title, font
+    average = draw.textlength(title, font=font) / len(title)
+    return "\n".join(textwrap.wrap(title, max(int(max_width / average), 10))), font
+
+def overlay_text(image, title=None, tracklist=(), max_tracks=12, margin=64, max_track_chars=48):
+    """
+    Draws the title in the top-left corner and the track list in the bottom-right, each on a translucent panel
+    """
+    if not title and not tracklist:
+        return image
+
+    overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    width, height = image.size
+
+    if title:
+        text, font = fit_title(draw, title, width * 0.6)
+        box = draw.multiline_textbbox((margin, margin), text, font=font, spacing=12)
+        draw.rounded_rectangle((box[0] - 24, box[1] - 18, box[2] + 24, box[3] + 18), radius=18, fill=(0, 0, 0, 120))
+        draw.multiline_text((margin, margin), text, font=font, fill=(255, 255, 255, 235), spacing=12)
+
+    tracks = list(tracklist)[:max_tracks]
+    if tracks:
+        font = load_font(30)
+        line_height = 44
+        lines = [f"{i:02d}  {textwrap.shorten(track, max_track_chars, placeholder='...')}" for i, track in enumerate(tracks, 1)]
+        text_width = max(draw.textlength(line, font=font) for line in lines)
+        left = width - margin - text_width
+        top = height - margin - line_height * len(lines)
+        draw.rounded_rectangle((left - 24, top - 18, width - margin + 24, height - margin + 6), radius=18, fill=(0, 0, 0, 110))
+        for i, line in enumerate(lines):
+            draw.text((left, top + i * line_height), line, font=font, fill=(255, 255, 255, 225))
+
+    return Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB")
+
+def render_variant(base_path, output_path, title=None, tracklist=(), seed=None, size=FRAME_SIZE):
+    """
+    Renders a unique frame from a cached base image on the CPU: a random crop scaled to size,
+    a random color grade and the title and track list overlaid.
+    Takes a fraction of a second, so runs can share one generated base image without looking identical.
+    """
+    rng = random.Random(seed)
+    with Image.open(base_path) as base:
+        frame = random_crop(base.convert("RGB"), rng, size)
+    frame = color_grade(frame, rng)
+    frame = overlay_text(frame, title, tracklist)
+    frame.save(output_path, quality=92)
+    return output_path
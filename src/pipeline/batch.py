@@ -0,0 +1,91 @@
+import os
+import re
+import json
+import shlex
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from .stages import build_pipeline
+from ..utils.file_manager import create_run_folders
+from ..utils.limiter import AdaptiveLimiter
+
+DEFAULT_SPEC = {
+    'genre': "lofi jazz",
+    'tracks': 15,
+    'target_duration': None,
+    'pool_size': 0,
+    'image_reuse': 'mood',
+    'visualizer': None
+}
+
+def load_specs(specs_path):
+    """
+    Reads a JSON list of mix specs, e.g. [{"name": "jazz", "genre": "lofi jazz", "tracks": 20, "target_duration": 3600, "pool_size": 40}].
+    Missing fields fall back to DEFAULT_SPEC.
+    """
+    with open(specs_path, 'r') as f:
+        specs = json.load(f)
+
+    loaded = []
+    for i, spec in enumerate(specs, 1):
+        spec = {**DEFAULT_SPEC, **spec}
+        if spec['target_duration'] is not None:
+            # A float like --target-duration parses to, so a resumed run hashes the same params
+            spec['target_duration'] = float(spec['target_duration'])
+        spec.setdefault('name', re.sub(r'[^A-Za-z0-9]+', '-', spec['genre']).strip('-').lower() or f"mix{i}")
+        spec['name'] = f"{i:02d}_{spec['name']}"
+        loaded.append(spec)
+    return loaded
+
+def resume_command(spec, run_folder):
+    """
+    The main.py command line that resumes a mix of the batch with its spec's settings.
+    They feed the stages' inputs hashes, so resuming with the defaults instead would redo the run.
+    """
+    args = ["python", "main.py", "full", "--run", run_folder, "--genre", spec['genre'], "--tracks", str(spec['tracks']),
+            "--pool-size", str(spec['pool_size']), "--image-reuse", spec['image_reuse']]
+    if spec['target_duration']:
+        args += ["--target-duration", str(spec['target_duration'])]
+    if spec['visualizer']:
+        args += ["--visualizer", spec['visualizer']]
+    return " ".join(shlex.quote(arg) for arg in args)
+
+async def run_batch(specs, suno_concurrency=3, cpu_workers=2, keep_mp3=False, profile=(), max_concurrency=10):
+    """
+    Produces every mix in specs from one process. All mixes share a single adaptive Suno concurrency limit,
+    while analysis, mixing and encoding share a bounded CPU pool, so the encode of one mix overlaps
+    the network-bound generation of the next.
+    """
+    start_time = time.perf_counter()
+    suno_limiter = AdaptiveLimiter(suno_concurrency, max_limit=max(max_concurrency, suno_concurrency))
+    cpu_slots = asyncio.Semaphore(cpu_workers)
+
+    async def run_mix(spec, analysis_executor):
+        folders = create_run_folders(name=spec['name'])
+        pipeline = build_pipeline(
+            folders, concurrent_limit=suno_concurrency, keep_mp3=keep_mp3,
+            genre=spec['genre'], tracks=spec['tracks'], target_duration=spec['target_duration'],
+            pool_size=spec['pool_size'],
+            suno_limiter=suno_limiter, cpu_slots=cpu_slots, analysis_executor=analysis_executor,
+            profile=profile, image_reuse=spec['image_reuse'], visualizer=spec['visualizer'],
+            # Visualizer frames are rendered in parallel too, so split the cores between the CPU slots
+            render_workers=max(1, (os.cpu_count() or 1) // cpu_workers)
+        )
+        try:
+            # Run up to the upload like `main.py full` does, leaving out the standalone mix stage
+            results = await pipeline.run(['upload'])
+            print(f"\n[{spec['name']}] Video uploaded successfully! ID: {results['upload']['video_id']}")
+            return True
+        except Exception as e:
+            print(f"\n[{spec['name']}] Run failed: {e}")
+            print(f"Resume it with: {resume_command(spec, folders['run'])}")
+            return False
+
+    with ProcessPoolExecutor(max_workers=cpu_workers) as analysis_executor:
+        outcomes = await asyncio.gather(*(run_mix(spec, analysis_executor) for spec in specs))
+
+    elapsed_hours = (time.perf_counter() - start_time) / 3600
+    completed = sum(outcomes)
+    print(f"\nBatch finished: {completed}/{len(specs)} mixes in {elapsed_hours * 60:.1f} minutes "
+          f"({completed / elapsed_hours:.2f} mixes/hour)")
+    return outcomes
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import cProfile
+from ..utils.metrics import Metrics, use_metrics, profiled
+
+MANIFEST_FILE = "manifest.json"
+
+def fingerprint(value):
+    """
+    Stable hash of a JSON-serializable value
+    """
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+class Stage:
+    """
+    A named step of the run. func receives the outputs of each dependency as a keyword argument
+    named after that dependency and returns a JSON-serializable dict of outputs.
+    files maps those outputs to the list of files the stage produced, so missing or changed files invalidate it.
+    """
+    def __init__(self, name, func, deps=(), params=None, files=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.files = files
+
+    def output_files(self, outputs):
+        return list(self.files(outputs)) if self.files else []
+
+class Pipeline:
+    """
+    Runs stages as a dependency graph and records each one in a manifest inside the run folder.
+    A stage is skipped when its recorded inputs hash still matches and its output files are unchanged,
+    so resuming a run only re-executes the stages that failed or were invalidated.
+    Each stage's wall time, CPU time, peak RSS and I/O are recorded in metrics and written to
+    metrics.json and metrics.prom in the run folder; stages named in profile (or 'all') are also run under cProfile.
+    """
+    def __init__(self, run_folder, metrics=None, profile=()):
+        self.run_folder = run_folder
+        self.manifest_path = os.path.join(run_folder, MANIFEST_FILE)
+        self.metrics = metrics or Metrics()
+        self.profile = set(profile)
+        self.stages = {}
+        self.background_tasks = []
+        self.manifest = {'stages': {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+
+    def add(self, name, func, deps=(), params=None, files=None):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = Stage(name, func, deps, params, files)
+
+    def background(self, awaitable):
+        """
+        Runs awaitable alongside the remaining stages; run() waits for it before returning,
+        but its failure doesn't fail the run
+        """
+        self.background_tasks.append(asyncio.ensure_future(awaitable))
+
+    def _save_manifest(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.run_folder, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _profile_path(self, name, suffix=""):
+        if name not in self.profile and 'all' not in self.profile:
+            return None
+        folder = os.path.join(self.run_folder, "profile")
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"{name}{suffix}.prof")
+
+    def profiled(self, name, func):
+        """
+        Returns func wrapped in cProfile if stage name is being profiled, for stages that offload blocking work to a thread
+        """
+        path = self._profile_path(name)
+        return profiled(func, path) if path else func
+
+    def _outputs_fingerprint(self, stage, outputs):
+        # Output files are part of the fingerprint so a re-rendered file invalidates everything downstream
+        files = []
+        for path in stage.output_files(outputs):
+            stat = os.stat(path)
+            files.append([path, stat.st_size, stat.st_mtime_ns])
+        return fingerprint({'outputs': outputs, 'files': files})
+
+    def _inputs_hash(self, stage):
+        records = self.manifest['stages']
+        return fingerprint({
+            'params': stage.params,
+            'deps': {dep: records[dep]['outputs_hash'] for dep in stage.deps}
+        })
+
+    def _is_current(self, stage, inputs_hash):
+        record = self.manifest['stages'].get(stage.name)
+        if not record or record.get('status') != 'completed' or record.get('inputs_hash') != inputs_hash:
+            return False
+        # A missing or changed output file (size or mtime) makes the stage stale, and its new outputs hash
+        # then invalidates every stage downstream of it
+        try:
+            return self._outputs_fingerprint(stage, record['outputs']) == record.get('outputs_hash')
+        except OSError:
+            return False
+
+    def _required(self, targets):
+        required = set()
+        pending = list(targets or self.stages)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(self.stages[name].deps)
+        return [name for name in self.stages if name in required]
+
+    async def run_stage(self, stage):
+        """
+        Runs a single stage unless its manifest record is still current, and returns its outputs
+        """
+        records = self.manifest['stages']
+        inputs_hash = self._inputs_hash(stage)
+        if self._is_current(stage, inputs_hash):
+            print(f"Skipping stage '{stage.name}' - already completed")
+            return records[stage.name]['outputs']
+
+        print(f"\nRunning stage '{stage.name}'...")
+        inputs = {dep: records[dep]['outputs'] for dep in stage.deps}
+        started = time.time()
+        try:
+            with self.metrics.stage(stage.name):
+                if asyncio.iscoroutinefunction(stage.func):
+                    loop_profile = self._profile_path(stage.name, ".loop")
+                    # Profiling the event loop also catches whatever other stages run on it meanwhile
+                    profiler = cProfile.Profile() if loop_profile else None
+                    if profiler:
+                        try:
+                            profiler.enable()
+                        except ValueError:
+                            # Only one profiler can be active per thread; another async stage holds it
+                            print(f"Not profiling stage '{stage.name}': the event loop is already being profiled")
+                            profiler = None
+                    try:
+                        outputs = await stage.func(**inputs)
+                    finally:
+                        if profiler:
+                            profiler.disable()
+                            profiler.dump_stats(loop_profile)
+                else:
+                    # Blocking stages run in a worker thread so independent stages keep making progress
+                    outputs = await asyncio.to_thread(self.profiled(stage.name, stage.func), **inputs)
+        except Exception as e:
+            records[stage.name] = {'status': 'failed', 'error': str(e), 'inputs_hash': inputs_hash}
+            self._save_manifest()
+            raise
+
+        # Round-trip through JSON so resumed and fresh runs see identical values (e.g. lists, not tuples)
+        outputs = json.loads(json.dumps(outputs))
+        records[stage.name] = {
+            'status': 'completed',
+            'inputs_hash': inputs_hash,
+            'outputs': outputs,
+            'outputs_hash': self._outputs_fingerprint(stage, outputs),
+            'started': started,
+            'finished': time.time()
+        }
+        self._save_manifest()
+        return outputs
+
+    async def run(self, targets=None):
+        """
+        Runs the given target stages (default: all) and everything they depend on.
+        Every stage starts as soon as its own dependencies finish, so independent stages run concurrently.
+        Returns a dict of outputs per stage that ran or was skipped.
+        """
+        tasks = {}
+
+        async def run_after_deps(stage):
+            await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+            return await self.run_stage(stage)
+
+        # _required lists dependencies before dependents, so every dep task exists before it is awaited.
+        # Tasks copy the current context when created, so everything they start reports to this run's metrics
+        with use_metrics(self.metrics):
+            for name in self._required(targets):
+                tasks[name] = asyncio.create_task(run_after_deps(self.stages[name]))
+
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for result in await asyncio.gather(*self.background_tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                print(f"Background task failed: {result}")
+        self.metrics.write_report(self.run_folder)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return dict(zip(tasks, results))
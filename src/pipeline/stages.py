@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+from .runner import Pipeline
+
+# Stage dependencies (pydub, NumPy, MoviePy, the Google and Anthropic SDKs) are imported inside each stage,
+# so a command only loads what the stages it actually runs need.
+
+# Frame rate of the still-image video; also what encode_fps is measured in
+VIDEO_FRAME_RATE = 1
+
+def build_pipeline(folders, concurrent_limit=3, keep_mp3=False, genre="lofi jazz", tracks=15, target_duration=None,
+                   pool_size=0, suno_limiter=None, cpu_slots=None, analysis_executor=None, profile=(),
+                   max_concurrency=10, image_reuse='mood', visualizer=None, render_workers=None):
+    """
+    Wires the run into a stage graph. Stages start as soon as their inputs are ready, so the metadata draft
+    (which needs nothing) and the base image (which needs the prompts) are produced while songs generate:
+
+        prompts                 -> songs, base_image
+        metadata_draft          -> image, metadata
+        songs                   -> playlist (the order songs are mixed in, chosen once)
+        base_image, playlist    -> image (the base with the title and track list overlaid)
+        songs, playlist, image  -> render (mixes straight into the video)
+        songs, playlist         -> mix (standalone combined_playlist.mp3, only run when asked for)
+        render, metadata_draft  -> metadata
+        render, metadata        -> upload
+
+    genre, tracks (number of prompts) and target_duration (seconds) describe the mix; pool_size adds that many
+    cached songs from earlier runs to choose from when packing to target_duration. image_reuse is the policy for
+    reusing a cached background image (see image/library.py). visualizer ('spectrum' or 'waveform') renders an
+    audio-reactive video with a now-playing title instead of the still image, across render_workers processes.
+    Suno concurrency starts at concurrent_limit and adapts up to max_concurrency.
+    suno_limiter, cpu_slots and analysis_executor let several pipelines share one Suno budget and CPU pool.
+    profile names the stages to run under cProfile (or 'all'); dumps go to <run>/profile.
+    """
+    cpu_slots = cpu_slots or asyncio.Semaphore(1)
+    pipeline = Pipeline(folders['run'], profile=profile)
+
+    async def prompts():
+        from ..utils.prompt_pool import PromptPool
+        pool = PromptPool()
+        try:
+            titles_and_prompts = await pool.draw(genre, tracks)
+        finally:
+            # A refill started by the draw keeps running alongside the rest of the run
+            pipeline.background(pool.close_when_idle())
+        print(f"Titles and Prompts: {titles_and_prompts}")
+        return {'titles_and_prompts': titles_and_prompts}
+
+    async def songs(prompts):
+        from ..audio.generator import iter_songs_async
+        from ..audio.processor import analyze_songs_async
+
+        # Generate individual songs, analyzing each one as soon as it is downloaded
+        song_stream = iter_songs_async(prompts['titles_and_prompts'], folders['music_segments'], concurrent_limit,
+                                       limiter=suno_limiter, pool_size=pool_size, max_concurrency=max_concurrency)
+        all_songs, analyses = await analyze_songs_async(song_stream, executor=analysis_executor)
+        return {'songs': all_songs, 'analyses': analyses}
+
+    def base_image(prompts):
+        from ..image.generator import find_base_image
+        return {'base_path': find_base_image(prompts['titles_and_prompts'], reuse=image_reuse)}
+
+    def image(base_image, playlist, metadata_draft):
+        from ..image.generator import render_background
+        # The track list is what the video actually plays; the visualizer shows the now-playing title there instead
+        tracklist = () if visualizer else [song['title'] for song in playlist['songs']]
+        image_path = render_background(base_image['base_path'], folders['photos'], metadata_draft['title'], tracklist)
+        return {'image_path': image_path}
+
+    def playlist(songs):
+        from ..audio.processor import order_playlist
+        # Chosen once so the standalone mix and the video play the same songs in the same order
+        analyses = [songs['analyses'].get(song['file_path']) for song in songs['songs']]
+        ordered, _ = order_playlist(songs['songs'], analyses, target_duration)
+        return {'songs': ordered}
+
+    def mix_audio(songs, playlist):
+        from ..audio.processor import concatenate_audio_files
+        audio_path, timestamps = concatenate_audio_files(
+            playlist['songs'], folders['music'], analyses=songs['analyses'], ordered=True
+        )
+        return {'audio_path': audio_path, 'timestamps': timestamps}
+
+    async def mix(songs, playlist):
+        async with cpu_slots:
+            return await asyncio.to_thread(pipeline.profiled('mix', mix_audio), songs, playlist)
+
+    def render_mix(songs, playlist, image):
+        from ..audio.processor import concatenate_audio_files
+        from ..video.creator import open_video_sink
+
+        # Mix the songs straight into the video muxer so the audio is encoded only once
+        video_path = os.path.join(folders['videos'], "playlist_video.mp4")
+        audio_copy_path = os.path.join(folders['music'], "combined_playlist.mp3") if keep_mp3 else None
+        started = time.perf_counter()
+        try:
+            sink = open_video_sink(image['image_path'], video_path, audio_copy_path=audio_copy_path,
+                                   video_frame_rate=VIDEO_FRAME_RATE)
+            audio_path, timestamps = concatenate_audio_files(
+                playlist['songs'], folders['music'], sink=sink, analyses=songs['analyses'], ordered=True
+            )
+        except Exception as e:
+            print(f"Mixing straight into the video failed, falling back to a separate encode: {e}")
+            return render_from_mp3(songs, playlist, image, video_path)
+        elapsed = time.perf_counter() - started
+        audio_seconds = sink.bytes_written / (sink.frame_rate * sink.channels * 2)
+        pipeline.metrics.observe('encode_fps', audio_seconds * VIDEO_FRAME_RATE / elapsed)
+        pipeline.metrics.observe('encode_realtime_factor', audio_seconds / elapsed)
+        print(f"Video saved as {video_path} ({audio_seconds / elapsed:.0f}x realtime)")
+        return {'video_path': video_path, 'audio_path': audio_path, 'timestamps': timestamps}
+
+    def render_from_mp3(songs, playlist, image, video_path):
+        from ..audio.processor import concatenate_audio_files
+        from ..video.creator import create_video_with_image
+
+        # Mix the same playlist to combined_playlist.mp3, then encode the video from it (ffmpeg, then MoviePy)
+        audio_path, timestamps = concatenate_audio_files(
+            playlist['songs'], folders['music'], analyses=songs['analyses'], ordered=True
+        )
+        create_video_with_image(audio_path, image['image_path'], video_path)
+        if not keep_mp3:
+            os.remove(audio_path)
+            audio_path = None
+        return {'video_path': video_path, 'audio_path': audio_path, 'timestamps': timestamps}
+
+    def render_visualized(songs, playlist, image):
+        from ..audio.processor import concatenate_audio_files
+        from ..video.visualizer import open_visualizer_sink, encode_visualized_video, FRAME_RATE
+
+        # Mix once into AAC plus a mono analysis copy, then render the frames from the finished mix
+        video_path = os.path.join(folders['videos'], "playlist_video.mp4")
+        audio_copy_path = os.path.join(folders['music'], "combined_playlist.mp3") if keep_mp3 else None
+        mix_path = os.path.join(folders['videos'], "playlist_audio.m4a")
+        analysis_path = os.path.join(folders['videos'], "playlist_audio.f32")
+        sink = open_visualizer_sink(mix_path, analysis_path, audio_copy_path=audio_copy_path)
+        audio_path, timestamps = concatenate_audio_files(
+            playlist['songs'], folders['music'], sink=sink, analyses=songs['analyses'], ordered=True
+        )
+        started = time.perf_counter()
+        try:
+            frames = encode_visualized_video(mix_path, analysis_path, image['image_path'], timestamps, video_path,
+                                             style=visualizer, workers=render_workers)
+        finally:
+            for path in (mix_path, analysis_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        elapsed = time.perf_counter() - started
+        pipeline.metrics.observe('encode_fps', frames / elapsed)
+        pipeline.metrics.observe('encode_realtime_factor', frames / FRAME_RATE / elapsed)
+        print(f"Video saved as {video_path} ({frames / elapsed:.0f} fps)")
+        return {'video_path': video_path, 'audio_path': audio_path, 'timestamps': timestamps}
+
+    async def render(songs, playlist, image):
+        # Mixing and encoding are CPU-bound, so they wait for a slot in the shared CPU budget
+        async with cpu_slots:
+            render_video = render_visualized if visualizer else render_mix
+            return await asyncio.to_thread(pipeline.profiled('render', render_video), songs, playlist, image)
+
+    def metadata_draft():
+        from ..youtube.uploader import draft_video_metadata
+        print("\nGenerating video metadata...")
+        title, description = draft_video_metadata(genre)
+        return {'title': title, 'description': description}
+
+    def metadata(render, metadata_draft):
+        from ..youtube.uploader import insert_timestamps
+        description = insert_timestamps(metadata_draft['description'], render['timestamps'])
+        return {'title': metadata_draft['title'], 'description': description}
+
+    def upload(render, metadata):
+        from ..youtube.uploader import upload_to_youtube
+        print("\nUploading to YouTube...")
+        video_id = upload_to_youtube(render['video_path'], metadata['title'], metadata['description'])
+        if not video_id:
+            raise RuntimeError("Video upload failed")
+        return {'video_id': video_id}
+
+    pipeline.add('prompts', prompts, params={'genre': genre, 'tracks': tracks})
+    pipeline.add('songs', songs, deps=['prompts'], params={'pool_size': pool_size},
+                 files=lambda outputs: [song['file_path'] for song in outputs['songs']])
+    pipeline.add('playlist', playlist, deps=['songs'], params={'target_duration': target_duration})
+    pipeline.add('mix', mix, deps=['songs', 'playlist'], files=lambda outputs: [outputs['audio_path']])
+    pipeline.add('metadata_draft', metadata_draft, params={'genre': genre})
+    pipeline.add('base_image', base_image, deps=['prompts'], params={'image_reuse': image_reuse},
+                 files=lambda outputs: [outputs['base_path']])
+    pipeline.add('image', image, deps=['base_image', 'playlist', 'metadata_draft'], params={'visualizer': visualizer},
+                 files=lambda outputs: [outputs['image_path']])
+    pipeline.add('render', render, deps=['songs', 'playlist', 'image'],
+                 params={'keep_mp3': keep_mp3, 'visualizer': visualizer},
+                 files=lambda outputs: [path for path in (outputs['video_path'], outputs['audio_path']) if path])
+    pipeline.add('metadata', metadata, deps=['render', 'metadata_draft'])
+    pipeline.add('upload', upload, deps=['render', 'metadata'])
+    return pipeline
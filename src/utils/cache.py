@@ -0,0 +1,43 @@
+import os
+import json
+import tempfile
+from .file_manager import get_cache_folder, evict_to_size
+
+class JsonCache:
+    """
+    Small on-disk key/value store with one JSON file per key and size-based LRU eviction.
+    Safe to use from several processes at once since every write is an atomic rename.
+    """
+    def __init__(self, name, max_bytes=16 * 1024 * 1024):
+        self.folder = get_cache_folder(name)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        Trims the cache down to max_bytes, dropping least recently used entries first
+        """
+        removed = evict_to_size(self.folder, self.max_bytes)
+        if removed:
+            print(f"Evicted {removed} entries from {self.folder}")
+        return removed
@@ -0,0 +1,26 @@
+_anthropic_client = None
+
+def get_anthropic_client():
+    """
+    Returns the shared Anthropic client, importing the SDK and constructing it on first use
+    so commands that never call Claude don't pay for it at startup
+    """
+    global _anthropic_client
+    if _anthropic_client is None:
+        from anthropic import Anthropic
+        from ..config import ANTHROPIC_API_KEY
+        _anthropic_client = Anthropic(api_key=ANTHROPIC_API_KEY)
+    return _anthropic_client
+
+_async_anthropic_client = None
+
+def get_async_anthropic_client():
+    """
+    Returns the shared AsyncAnthropic client, created on first use like get_anthropic_client
+    """
+    global _async_anthropic_client
+    if _async_anthropic_client is None:
+        from anthropic import AsyncAnthropic
+        from ..config import ANTHROPIC_API_KEY
+        _async_anthropic_client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+    return _async_anthropic_client
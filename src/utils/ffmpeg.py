@@ -0,0 +1,52 @@
+import shutil
+import subprocess
+
+def get_ffmpeg_binary():
+    """
+    Finds the ffmpeg executable, preferring the one on PATH over the imageio-ffmpeg bundle
+    """
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        raise FileNotFoundError("ffmpeg was not found on PATH and imageio-ffmpeg is not available")
+
+class PcmSink:
+    """
+    Feeds raw signed 16-bit PCM into an ffmpeg process through its stdin
+    """
+    def __init__(self, output_args, frame_rate=44100, channels=2, input_args=None, audio_path=None):
+        self.frame_rate = frame_rate
+        self.audio_path = audio_path
+        self.channels = channels
+        self.bytes_written = 0
+        command = [
+            get_ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(frame_rate), "-ac", str(channels), "-i", "pipe:0"
+        ]
+        command += list(input_args or [])
+        command += list(output_args)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+        self.bytes_written += len(data)
+
+    def close(self):
+        self.process.stdin.close()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}: {stderr.decode(errors='replace').strip()}")
+
+    def abort(self):
+        self.process.kill()
+        self.process.wait()
+
+def open_mp3_sink(output_path, frame_rate=44100, channels=2):
+    """
+    Opens a PCM sink that encodes straight to an MP3 file
+    """
+    return PcmSink(["-f", "mp3", output_path], frame_rate=frame_rate, channels=channels, audio_path=output_path)
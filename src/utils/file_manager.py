@@ -3,14 +3,23 @@ import time
 import hashlib
 import re
 
-def create_run_folders():
+def create_run_folders(run_folder=None, name=None):
     """
-    Creates a structured folder hierarchy for the current run using timestamp
+    Creates a structured folder hierarchy for the current run using timestamp, suffixed with name if given.
+    Pass an existing run folder (path or timestamp name) to reuse it when resuming.
     """
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    base_folder = os.path.join("Output", timestamp)
+    if run_folder is None:
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        base_folder = os.path.join("Output", f"{timestamp}_{name}" if name else timestamp)
+    elif os.path.isdir(run_folder):
+        base_folder = run_folder
+    else:
+        base_folder = os.path.join("Output", run_folder)
+        if not os.path.isdir(base_folder):
+            raise FileNotFoundError(f"Run folder not found: {run_folder}")
     
     folders = {
+        'run': base_folder,
         'music': os.path.join(base_folder, 'music'),
         'photos': os.path.join(base_folder, 'photos'),
         'videos': os.path.join(base_folder, 'videos'),
@@ -31,4 +40,52 @@ def create_folder_for_prompt(prompt, base_folder):
     prompt_folder = os.path.join(base_folder, f"{sanitized_prompt}_{prompt_hash}")
     
     os.makedirs(prompt_folder, exist_ok=True)
-    return prompt_folder
\ No newline at end of file
+    return prompt_folder
+
+CACHE_FOLDER = os.path.join("Output", ".cache")
+
+def get_cache_folder(name):
+    """
+    Returns a persistent cache folder shared across runs, creating it if needed
+    """
+    folder = os.path.join(CACHE_FOLDER, name)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's contents, read in chunks
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def evict_to_size(folder, max_bytes):
+    """
+    Deletes the least recently used files under folder until it fits in max_bytes.
+    Recency is the file mtime, which cache readers bump on every hit.
+    """
+    entries = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
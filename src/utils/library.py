@@ -0,0 +1,46 @@
+import os
+import sqlite3
+from .file_manager import get_cache_folder
+
+class SqliteLibrary:
+    """
+    Base for the cross-run libraries under Output/.cache: files indexed in an SQLite library.db, in a table with
+    key, size and last_used columns, and evicted least recently used first once max_bytes is exceeded.
+    Subclasses set table and schema and implement _remove_files(key).
+    """
+    table = None
+    schema = None
+
+    def __init__(self, folder_name, max_bytes):
+        self.folder = get_cache_folder(folder_name)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(os.path.join(self.folder, "library.db"), timeout=30)
+        self.db.execute(self.schema)
+        self.db.commit()
+
+    def evict(self):
+        """
+        Drops least recently used entries until the library fits in max_bytes
+        """
+        total = self.db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        removed = 0
+        for key, size in self.db.execute(f"SELECT key, size FROM {self.table} ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(key)
+            total -= size
+            removed += 1
+        if removed:
+            print(f"Evicted {removed} {self.table} from the library")
+        return removed
+
+    def _remove_files(self, key):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        self._remove_files(key)
+        self.db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
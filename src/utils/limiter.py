@@ -0,0 +1,104 @@
+import time
+import asyncio
+import datetime
+from email.utils import parsedate_to_datetime
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (either delta-seconds or an HTTP date), or None
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the server with AIMD: every success raises the limit by 1/limit
+    (about one slot per round of requests), and an overload (429, 5xx, timeout) halves it, at most once
+    per cooldown so a burst of failures from the same round only counts once.
+    A Retry-After pauses new acquisitions until it has passed. Use it like a semaphore:
+
+        async with limiter:
+            ...
+            limiter.record_success()  # or limiter.record_overload(retry_after)
+    """
+    def __init__(self, initial=3, min_limit=1, max_limit=10, decrease=0.5, cooldown=5.0):
+        self.limit = float(max(min(initial, max_limit), min_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self.last_decrease = float('-inf')
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            while True:
+                delay = self.resume_at - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                else:
+                    await self.condition.wait()
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
+
+    def record_success(self):
+        self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+    def record_overload(self, retry_after=None):
+        now = time.monotonic()
+        if retry_after:
+            self.resume_at = max(self.resume_at, now + retry_after)
+        if now - self.last_decrease >= self.cooldown:
+            self.limit = max(self.limit * self.decrease, self.min_limit)
+            self.last_decrease = now
+            print(f"Suno is overloaded, lowering concurrency to {int(self.limit)}"
+                  + (f" and pausing {retry_after:.1f}s" if retry_after else ""))
+
+class RetryBudget:
+    """
+    Caps retries across a run to ratio of first attempts (plus a small floor), so an outage
+    doesn't multiply the load on the server with every song retrying at once
+    """
+    def __init__(self, ratio=0.5, minimum=3):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.attempts = 0
+        self.retries = 0
+
+    def record_attempt(self):
+        self.attempts += 1
+
+    def try_spend(self):
+        if self.retries >= self.minimum + self.ratio * self.attempts:
+            return False
+        self.retries += 1
+        return True
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import cProfile
+import resource
+import threading
+import contextlib
+import contextvars
+
+_current = contextvars.ContextVar('metrics', default=None)
+
+def _read_proc_io():
+    """
+    Bytes read and written by this process (files, pipes and sockets), from /proc/self/io where available
+    """
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+def _current_rss():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux; it's the lifetime peak, but better than nothing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+class RssSampler:
+    """
+    Tracks peak resident memory over an interval by polling in a background thread
+    """
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = _current_rss()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, _current_rss())
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+class Metrics:
+    """
+    Per-run collection of stage resource usage, counters, gauges and per-song latencies.
+    Stages that overlap share the process, so their CPU time and I/O figures include each other's work.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.songs = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Records wall time, CPU time (including child processes), peak RSS and bytes in/out of a block
+        """
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+        read_bytes, write_bytes = _read_proc_io()
+        status = 'failed'
+        with RssSampler() as sampler:
+            try:
+                yield
+                status = 'completed'
+            finally:
+                end_read, end_write = _read_proc_io()
+                with self.lock:
+                    self.stages[name] = {
+                        'status': status,
+                        'wall_seconds': time.perf_counter() - wall,
+                        'cpu_seconds': _cpu_seconds() - cpu,
+                        'peak_rss_bytes': sampler.peak,
+                        'bytes_in': end_read - read_bytes,
+                        'bytes_out': end_write - write_bytes
+                    }
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def song_event(self, song, event):
+        """
+        Marks a point in a song's life (e.g. submitted, streaming, downloaded); latencies are relative to the first event
+        """
+        with self.lock:
+            self.songs.setdefault(song, {})[event] = time.time()
+
+    def report(self):
+        with self.lock:
+            songs = {}
+            for song, events in self.songs.items():
+                start = min(events.values())
+                songs[song] = {event: moment - start for event, moment in events.items()}
+            return {
+                'stages': dict(self.stages),
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'song_latency_seconds': songs
+            }
+
+    def to_prometheus(self):
+        """
+        Renders the report in the Prometheus text exposition format
+        """
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        report = self.report()
+        lines = []
+        for field in ('wall_seconds', 'cpu_seconds', 'peak_rss_bytes', 'bytes_in', 'bytes_out'):
+            lines.append(f"# TYPE pipeline_stage_{field} gauge")
+            for stage, values in report['stages'].items():
+                lines.append(f'pipeline_stage_{field}{{stage="{label(stage)}"}} {values[field]}')
+        for name, value in report['counters'].items():
+            lines.append(f"# TYPE pipeline_{name}_total counter")
+            lines.append(f"pipeline_{name}_total {value}")
+        for name, value in report['gauges'].items():
+            lines.append(f"# TYPE pipeline_{name} gauge")
+            lines.append(f"pipeline_{name} {value}")
+        if report['song_latency_seconds']:
+            lines.append("# TYPE pipeline_song_latency_seconds gauge")
+            for song, events in report['song_latency_seconds'].items():
+                for event, seconds in events.items():
+                    lines.append(f'pipeline_song_latency_seconds{{song="{label(song)}",event="{label(event)}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, folder):
+        """
+        Writes metrics.json and metrics.prom into folder
+        """
+        with open(os.path.join(folder, "metrics.json"), 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        with open(os.path.join(folder, "metrics.prom"), 'w') as f:
+            f.write(self.to_prometheus())
+
+_fallback = Metrics()
+
+def get_metrics():
+    """
+    Metrics of the run the calling code belongs to (tasks and worker threads inherit it from the pipeline)
+    """
+    return _current.get() or _fallback
+
+@contextlib.contextmanager
+def use_metrics(metrics):
+    """
+    Makes metrics the current collector for tasks and threads started inside the block
+    """
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+def profiled(func, output_path):
+    """
+    Wraps a blocking function so each call is recorded with cProfile and dumped to output_path
+    """
+    def wrapper(*args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            profiler.dump_stats(output_path)
+    return wrapper
@@ -1,25 +1,36 @@
-from ..config import anthropic_client
+import json
+from .clients import get_anthropic_client, get_async_anthropic_client
 
-def get_prompts_from_gpt():
+PROMPT_MODEL = "claude-3-sonnet-20240229"
+
+# Themes handed to concurrent requests so each batch explores different ground
+PROMPT_THEMES = [
+    "late nights and city lights", "rainy days indoors", "early mornings and coffee", "travel and trains",
+    "nature and the seasons", "nostalgia and old memories", "studying and focus", "seaside towns",
+    "snowy evenings", "rooftops and summer nights", "old bookshops and libraries", "quiet Sunday afternoons"
+]
+
+def build_prompt_request(genre="lofi jazz", count=15, theme=None):
     """
-    Fetches 15 unique lofi jazz prompts from Claude.
+    The instructions asking Claude for count prompts as a JSON array, optionally steered towards a theme
     """
-    prompt = """
-    You are tasked with generating unique prompts for smooth lofi jazz songs that will be used with SunoAI, a Prompt To Music generator. Your goal is to create a table of prompts, each with a creative title and a corresponding prompt that describes the style and topic of the song.
+    theme_line = f" Draw the moods and settings of this batch from the theme: {theme}." if theme else ""
+    return f"""
+    You are tasked with generating unique prompts for smooth {genre} songs that will be used with SunoAI, a Prompt To Music generator. Your goal is to create a list of prompts, each with a creative title and a corresponding prompt that describes the style and topic of the song.
 
     Follow these guidelines when creating the prompts:
     1. Focus on describing the style of music and the topic or mood of the song.
     2. Use genres, sub-genres, and vibes instead of referencing specific artists or songs.
-    3. Incorporate various instruments, tempos, and atmospheric elements commonly associated with lofi jazz.
+    3. Incorporate various instruments, tempos, and atmospheric elements commonly associated with {genre}.
     4. Include diverse themes and emotions to ensure a wide range of unique prompts.
     5. Keep the prompts concise but descriptive, typically 20-40 words each.
 
-    Create a table with two columns: "Title" and "Prompt". Generate 15 unique entries, ensuring that each prompt is distinct and creative.
+    Generate {count} unique entries, each with a creative title and a prompt, ensuring that each prompt is distinct and creative.{theme_line}
 
     To generate the prompts:
-    1. Think about different moods, settings, and emotions that can be expressed through lofi jazz.
+    1. Think about different moods, settings, and emotions that can be expressed through {genre}.
     2. Consider various instruments and sound elements that are characteristic of the genre.
-    3. Imagine unique scenarios or themes that could inspire a lofi jazz composition.
+    3. Imagine unique scenarios or themes that could inspire a {genre} composition.
     4. Combine these elements to create a cohesive and evocative prompt.
 
     Here are some examples of good prompts:
@@ -30,41 +41,65 @@ def get_prompts_from_gpt():
 
     "Relaxed lofi jazz with soothing vibraphone, light percussive brushes, and gentle electric piano, creating a calm, reflective mood for a cloudy afternoon."
 
-    Present your output in the following format:
+    Return only a JSON array, with no other text, where each entry has a "title" and a "prompt", for example:
+
+    [
+      {{"title": "Midnight Espresso", "prompt": "A chill lofi jazz track featuring ..."}},
+      ...
+    ]
+
+    Ensure that the array contains exactly {count} unique {genre} song prompts. Be creative and diverse in your suggestions, covering a wide range of moods, themes, and musical elements within the {genre} genre.
+    """
+
+def max_tokens_for(count):
+    # Prompts run 20-40 words, about 80 tokens per entry with its title and the JSON around it
+    return 256 + count * 80
+
+def parse_prompts(content):
+    """
+    Extracts (title, prompt) pairs from Claude's JSON answer, ignoring any text around the array
+    and entries without a prompt
+    """
+    start, end = content.find('['), content.rfind(']')
+    if start == -1 or end < start:
+        raise ValueError("No JSON array in Claude's answer")
+    entries = json.loads(content[start:end + 1])
 
-    <table>
-    | Title | Prompt |
-    |-------|--------|
-    | [Title 1] | [Prompt 1] |
-    | [Title 2] | [Prompt 2] |
-    ...
-    | [Title 15] | [Prompt 15] |
-    </table>
+    titles_and_prompts = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        title = str(entry.get('title', "")).strip()
+        prompt = str(entry.get('prompt', "")).strip()
+        if prompt:
+            titles_and_prompts.append((title or prompt[:40], prompt))
+    return titles_and_prompts
 
-    Ensure that your table contains exactly 15 rows of unique lofi jazz song prompts. Be creative and diverse in your suggestions, covering a wide range of moods, themes, and musical elements within the lofi jazz genre.
+def get_prompts_from_gpt(genre="lofi jazz", count=15):
+    """
+    Fetches `count` unique prompts for the given genre (15 lofi jazz prompts by default) from Claude.
+    Runs use the prompt pool (see prompt_pool.py) instead, which doesn't wait on Claude.
     """
-    
-    response = anthropic_client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=1024,
+    response = get_anthropic_client().messages.create(
+        model=PROMPT_MODEL,
+        max_tokens=max_tokens_for(count),
         messages=[{
             "role": "user",
-            "content": prompt
+            "content": build_prompt_request(genre, count)
         }]
     )
-    
-    content = response.content[0].text
-    print("Received prompts from Claude:\n", content)
+    return parse_prompts(response.content[0].text)
 
-    # Updated parsing logic
-    titles_and_prompts = []
-    for line in content.splitlines():
-        if '|' in line:
-            parts = line.split('|')
-            if len(parts) >= 3:  # Valid table row should have at least 3 parts
-                title = parts[1].strip()
-                prompt = parts[2].strip()
-                if prompt and prompt != 'Prompt' and not all(c in '-' for c in prompt):
-                    titles_and_prompts.append((title, prompt))
-    
-    return titles_and_prompts
\ No newline at end of file
+async def generate_prompts_async(genre="lofi jazz", count=25, theme=None):
+    """
+    Async version of get_prompts_from_gpt, for refilling the prompt pool with concurrent requests
+    """
+    response = await get_async_anthropic_client().messages.create(
+        model=PROMPT_MODEL,
+        max_tokens=max_tokens_for(count),
+        messages=[{
+            "role": "user",
+            "content": build_prompt_request(genre, count, theme)
+        }]
+    )
+    return parse_prompts(response.content[0].text)
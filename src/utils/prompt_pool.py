@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import asyncio
+import sqlite3
+from .file_manager import get_cache_folder
+from .metrics import get_metrics
+from .prompt_generator import generate_prompts_async, PROMPT_THEMES
+
+# MinHash over character shingles, indexed with LSH: 16 bands of 4 rows put prompts with a Jaccard
+# similarity around 0.5 or more in a shared bucket, and candidates are then checked against SIMILARITY_THRESHOLD
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+BANDS = 16
+SIMILARITY_THRESHOLD = 0.6
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1770)
+# Fixed seeds so signatures stored by earlier runs stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Set of hashed character n-grams of text, ignoring case, punctuation and spacing differences
+    """
+    text = " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+    if len(text) <= size:
+        return {zlib.crc32(text.encode())}
+    return {zlib.crc32(text[i:i + size].encode()) for i in range(len(text) - size + 1)}
+
+def minhash(text):
+    """
+    MinHash signature of text: for each permutation, the smallest permuted shingle hash
+    """
+    hashed = shingles(text)
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashed) & 0xffffffff for a, b in _PERMUTATIONS]
+
+def similarity(signature, other):
+    """
+    Estimated Jaccard similarity of the texts behind two signatures
+    """
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+def band_buckets(signature):
+    rows = len(signature) // BANDS
+    return [(band, ",".join(map(str, signature[band * rows:(band + 1) * rows]))) for band in range(BANDS)]
+
+class PromptPool:
+    """
+    Cross-run pool of song prompts in SQLite, refilled from Claude in large concurrent batches so a run
+    can draw its prompts straight away. Every prompt ever accepted (used or not) stays in a MinHash LSH
+    index, and new prompts too similar to any of them are rejected.
+    """
+    def __init__(self, batch_size=25, concurrent_requests=4, low_water=30):
+        self.batch_size = batch_size
+        self.concurrent_requests = concurrent_requests
+        self.low_water = low_water
+        self.db = sqlite3.connect(os.path.join(get_cache_folder("prompts"), "pool.db"), timeout=30)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS prompts (
+                id INTEGER PRIMARY KEY,
+                genre TEXT NOT NULL,
+                title TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                created REAL NOT NULL,
+                used REAL
+            );
+            CREATE INDEX IF NOT EXISTS prompts_available ON prompts (genre, used);
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                prompt_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket);
+        """)
+        self.db.commit()
+        self.refilling = {}
+
+    def available(self, genre):
+        return self.db.execute("SELECT COUNT(*) FROM prompts WHERE genre = ? AND used IS NULL", (genre,)).fetchone()[0]
+
+    def find_similar(self, signature):
+        """
+        Returns the stored prompt most similar to signature if it reaches SIMILARITY_THRESHOLD, else None
+        """
+        candidates = set()
+        for band, bucket in band_buckets(signature):
+            rows = self.db.execute("SELECT prompt_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket))
+            candidates.update(prompt_id for prompt_id, in rows)
+
+        best, best_score = None, SIMILARITY_THRESHOLD
+        for prompt_id in candidates:
+            prompt, stored = self.db.execute("SELECT prompt, signature FROM prompts WHERE id = ?", (prompt_id,)).fetchone()
+            score = similarity(signature, json.loads(stored))
+            if score >= best_score:
+                best, best_score = prompt, score
+        return best
+
+    def add(self, genre, title, prompt):
+        """
+        Adds a prompt unless it is a near-duplicate of one already in the pool; returns whether it was added
+        """
+        signature = minhash(prompt)
+        if self.find_similar(signature):
+            return False
+        cursor = self.db.execute(
+            "INSERT INTO prompts (genre, title, prompt, signature, created) VALUES (?, ?, ?, ?, ?)",
+            (genre, title, prompt, json.dumps(signature), time.time())
+        )
+        self.db.executemany(
+            "INSERT INTO buckets (band, bucket, prompt_id) VALUES (?, ?, ?)",
+            [(band, bucket, cursor.lastrowid) for band, bucket in band_buckets(signature)]
+        )
+        self.db.commit()
+        return True
+
+    async def refill(self, genre):
+        """
+        Requests concurrent_requests batches of batch_size prompts from Claude, each steered towards a different
+        theme, and adds every prompt that isn't a near-duplicate as soon as its batch arrives
+        """
+        themes = random.sample(PROMPT_THEMES, min(self.concurrent_requests, len(PROMPT_THEMES)))
+        requests = [generate_prompts_async(genre, self.batch_size, theme) for theme in themes]
+        added = rejected = 0
+        for request in asyncio.as_completed(requests):
+            try:
+                titles_and_prompts = await request
+            except Exception as e:
+                print(f"Error generating prompts for the pool: {e}")
+                continue
+            for title, prompt in titles_and_prompts:
+                if self.add(genre, title, prompt):
+                    added += 1
+                else:
+                    rejected += 1
+        metrics = get_metrics()
+        metrics.increment('prompts_added', added)
+        metrics.increment('prompts_rejected', rejected)
+        print(f"Prompt pool: added {added} {genre} prompts, rejected {rejected} near-duplicates "
+              f"({self.available(genre)} available)")
+        return added
+
+    def refill_in_background(self, genre):
+        """
+        Starts a refill unless one is already running for genre; returns its task
+        """
+        task = self.refilling.get(genre)
+        if task is None or task.done():
+            task = self.refilling[genre] = asyncio.create_task(self.refill(genre))
+        return task
+
+    def claim(self, genre, count):
+        """
+        Marks up to count of the oldest unused prompts as used and returns them as (title, prompt) pairs
+        """
+        with self.db:
+            # BEGIN IMMEDIATE so concurrent runs (e.g. in batch mode) never claim the same prompts
+            self.db.execute("BEGIN IMMEDIATE")
+            rows = self.db.execute(
+                "SELECT id, title, prompt FROM prompts WHERE genre = ? AND used IS NULL ORDER BY created LIMIT ?",
+                (genre, count)
+            ).fetchall()
+            self.db.executemany("UPDATE prompts SET used = ? WHERE id = ?", [(time.time(), row[0]) for row in rows])
+        return [(title, prompt) for _, title, prompt in rows]
+
+    async def draw(self, genre, count):
+        """
+        Returns count fresh prompts for genre, only waiting on Claude when the pool can't cover them.
+        Starts a background refill once fewer than low_water prompts are left.
+        """
+        while self.available(genre) < count:
+            if not await self.refill_in_background(genre):
+                raise RuntimeError(f"Could not generate enough new {genre} prompts (have {self.available(genre)}, need {count})")
+
+        titles_and_prompts = self.claim(genre, count)
+        if self.available(genre) < max(self.low_water, count):
+            self.refill_in_background(genre)
+        return titles_and_prompts
+
+    def close(self):
+        self.db.close()
+
+    async def close_when_idle(self):
+        """
+        Closes the pool once any background refill has finished
+        """
+        await asyncio.gather(*self.refilling.values(), return_exceptions=True)
+        self.close()
@@ -1,11 +1,87 @@
-from moviepy.editor import AudioFileClip, ImageClip
+import os
+import subprocess
+from ..utils.ffmpeg import get_ffmpeg_binary, PcmSink
 
-def create_video_with_image(audio_path, image_path, output_video_path):
+# Audio codecs MP4 can carry as-is, so the mix is muxed without a second lossy encode
+COPYABLE_AUDIO = {'.mp3', '.m4a', '.aac'}
+
+def static_video_args(height=720, frame_rate=1, keyframe_seconds=60):
+    """
+    x264 output options for a still background: still-image tuning, very low frame rate and a long GOP
     """
-    Creates a video by combining an audio file with a static image
+    return [
+        "-vf", f"scale=-2:{height},format=yuv420p",
+        "-c:v", "libx264", "-tune", "stillimage", "-preset", "medium",
+        "-r", str(frame_rate), "-g", str(frame_rate * keyframe_seconds),
+    ]
+
+def encode_static_video(audio_path, image_path, output_video_path, height=720, frame_rate=1, keyframe_seconds=60):
     """
+    Encodes a still image and an audio track straight with ffmpeg.
+    The image is decoded once and x264 runs with still-image tuning at a very low frame rate,
+    so nothing is rendered per frame in Python.
+    """
+    copy_audio = os.path.splitext(audio_path)[1].lower() in COPYABLE_AUDIO
+    command = [
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-loop", "1", "-framerate", str(frame_rate), "-i", image_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        *static_video_args(height, frame_rate, keyframe_seconds),
+        "-c:a", "copy" if copy_audio else "aac",
+    ]
+    if not copy_audio:
+        command += ["-b:a", "192k"]
+    command += ["-shortest", "-movflags", "+faststart", output_video_path]
+
+    result = subprocess.run(command, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+
+def open_video_sink(image_path, output_video_path, frame_rate=44100, channels=2, audio_copy_path=None,
+                    height=720, video_frame_rate=1):
+    """
+    Opens a PCM sink that muxes the incoming mix with a still image straight into an MP4.
+    The audio is encoded exactly once; audio_copy_path optionally writes a standalone MP3 from the same PCM.
+    """
+    output_args = [
+        "-map", "1:v:0", "-map", "0:a:0",
+        *static_video_args(height, video_frame_rate),
+        "-c:a", "aac", "-b:a", "192k",
+        "-shortest", "-movflags", "+faststart", output_video_path
+    ]
+    if audio_copy_path:
+        output_args += ["-map", "0:a:0", "-f", "mp3", audio_copy_path]
+
+    return PcmSink(
+        output_args, frame_rate=frame_rate, channels=channels,
+        input_args=["-loop", "1", "-framerate", str(video_frame_rate), "-i", image_path],
+        audio_path=audio_copy_path
+    )
+
+def create_video_with_moviepy(audio_path, image_path, output_video_path):
+    """
+    Renders the video frame by frame through MoviePy
+    """
+    from moviepy.editor import AudioFileClip, ImageClip
+
     audio_clip = AudioFileClip(audio_path)
     image_clip = ImageClip(image_path).set_duration(audio_clip.duration).resize(height=720)
     video = image_clip.set_audio(audio_clip)
     video.write_videofile(output_video_path, fps=24, codec="libx264")
-    print(f"Video saved as {output_video_path}")
\ No newline at end of file
+
+def create_video_with_image(audio_path, image_path, output_video_path, fast=True):
+    """
+    Creates a video by combining an audio file with a static image.
+    Uses the direct ffmpeg encoder and falls back to MoviePy if it fails.
+    """
+    if fast:
+        try:
+            encode_static_video(audio_path, image_path, output_video_path)
+            print(f"Video saved as {output_video_path}")
+            return
+        except Exception as e:
+            print(f"Static image encode failed, falling back to MoviePy: {e}")
+
+    create_video_with_moviepy(audio_path, image_path, output_video_path)
+    print(f"Video saved as {output_video_path}")
@@ -0,0 +1,297 @@
+import os
+import shutil
+import textwrap
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, ImageDraw
+from ..utils.ffmpeg import get_ffmpeg_binary, PcmSink
+from ..image.variants import load_font
+
+VISUALIZER_STYLES = ('spectrum', 'waveform')
+
+# The mix is analyzed as mono at this rate: plenty for a visual, and a quarter of the data to transform
+ANALYSIS_RATE = 11025
+FRAME_RATE = 30
+FRAME_SIZE = (1280, 720)
+
+def parse_timestamp(timestamp):
+    """
+    Seconds from an MM:SS or H:MM:SS timestamp (see processor.format_timestamp)
+    """
+    seconds = 0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+def open_visualizer_sink(audio_path, analysis_path, frame_rate=44100, channels=2, audio_copy_path=None):
+    """
+    Opens a PCM sink that encodes the mix once to AAC (muxed into the video afterwards without re-encoding),
+    and also writes a mono float32 copy at ANALYSIS_RATE for the visualizer to memory-map
+    """
+    output_args = [
+        "-map", "0:a:0", "-c:a", "aac", "-b:a", "192k", "-f", "ipod", audio_path,
+        "-map", "0:a:0", "-ac", "1", "-ar", str(ANALYSIS_RATE), "-f", "f32le", analysis_path
+    ]
+    if audio_copy_path:
+        output_args += ["-map", "0:a:0", "-f", "mp3", audio_copy_path]
+    return PcmSink(output_args, frame_rate=frame_rate, channels=channels, audio_path=audio_copy_path)
+
+def band_energies(samples, rate=ANALYSIS_RATE, fps=FRAME_RATE, bands=64, n_fft=2048, min_freq=40,
+                  floor_db=-60.0, smoothing=0.6, chunk_frames=4096):
+    """
+    Per-frame spectrum levels (0-1) in log-spaced bands, as a (frames, bands) float32 array.
+    The STFT is vectorized over chunk_frames frames at a time (windows are strided views of the samples,
+    so only one chunk is ever materialized), then smoothed over time with a one-pole filter so bars fall gently.
+    """
+    from scipy.signal import lfilter
+
+    frames = int(len(samples) * fps / rate)
+    if len(samples) < n_fft:
+        samples = np.pad(np.asarray(samples, np.float32), (0, n_fft - len(samples)))
+    windows = np.lib.stride_tricks.sliding_window_view(samples, n_fft)
+    # Windows are centered on each frame's time, clamped at both ends of the mix
+    starts = np.clip((np.arange(frames) * rate / fps).astype(np.int64) - n_fft // 2, 0, len(windows) - 1)
+    window = np.hanning(n_fft).astype(np.float32)
+
+    # Rectangular filterbank: each FFT bin adds to the log-spaced band it falls in
+    freqs = np.fft.rfftfreq(n_fft, 1 / rate)
+    edges = np.geomspace(min_freq, rate / 2, bands + 1)
+    band_of_bin = np.clip(np.searchsorted(edges, freqs) - 1, -1, bands - 1)
+    filterbank = np.zeros((len(freqs), bands), np.float32)
+    valid = band_of_bin >= 0
+    filterbank[np.flatnonzero(valid), band_of_bin[valid]] = 1.0
+    # Low bands narrower than one bin take the bin nearest their center instead of staying empty
+    empty = np.flatnonzero(filterbank.sum(axis=0) == 0)
+    centers = np.sqrt(edges[empty] * edges[empty + 1])
+    filterbank[np.clip(np.rint(centers * n_fft / rate).astype(int), 0, len(freqs) - 1), empty] = 1.0
+    filterbank /= np.maximum(filterbank.sum(axis=0), 1.0)
+
+    levels = np.empty((frames, bands), np.float32)
+    for start in range(0, frames, chunk_frames):
+        chunk = windows[starts[start:start + chunk_frames]] * window
+        power = np.abs(np.fft.rfft(chunk, axis=1)) ** 2
+        levels[start:start + chunk_frames] = power.astype(np.float32) @ filterbank
+
+    reference = max(float(np.percentile(levels, 99.5)), 1e-12) if frames else 1.0
+    levels = 10 * np.log10(np.maximum(levels, 1e-12) / reference)
+    levels = np.clip((levels - floor_db) / -floor_db, 0.0, 1.0)
+    return lfilter([1 - smoothing], [1, -smoothing], levels, axis=0).astype(np.float32)
+
+class FrameRenderer:
+    """
+    Draws visualizer frames over a fixed background into one preallocated RGB buffer.
+    Every per-frame step writes into existing arrays (out= and copyto with a mask), so rendering a frame
+    allocates nothing. Bars (or the waveform envelope) are lit by copying from a pre-tinted copy of the
+    background, and now-playing titles are pre-rendered once per track.
+    """
+    def __init__(self, background, style='spectrum', bands=64, titles=(), color=(255, 214, 160), margin=48,
+                 area_height=220):
+        if style not in VISUALIZER_STYLES:
+            raise ValueError(f"Unknown visualizer style '{style}', expected one of {', '.join(VISUALIZER_STYLES)}")
+        self.style = style
+        self.background = np.ascontiguousarray(background, dtype=np.uint8)
+        self.frame = self.background.copy()
+        height, width = self.background.shape[:2]
+
+        # The visualizer area along the bottom, and its lit version (background blended towards color)
+        self.area = (slice(height - margin - area_height, height - margin), slice(margin, width - margin))
+        area_background = self.background[self.area].astype(np.float32)
+        self.lit = (area_background * 0.25 + np.array(color, np.float32) * 0.75).astype(np.uint8)
+        self.area_height, self.area_width = self.lit.shape[:2]
+
+        self.rows = np.arange(self.area_height, dtype=np.int32)[:, None]
+        self.mask = np.empty((self.area_height, self.area_width), bool)
+        self.below = np.empty_like(self.mask)
+        self.top = np.empty(self.area_width, np.int32)
+        self.bottom = np.empty(self.area_width, np.int32)
+        self.scaled = np.empty(self.area_width, np.float32)
+        self.low = np.empty(self.area_width, np.float32)
+        self.high = np.empty(self.area_width, np.float32)
+
+        # Bars are separated by a gap: columns in the gap map to no band and stay dark
+        column_band = np.arange(self.area_width) * bands // self.area_width
+        in_gap = (np.arange(self.area_width) * bands % self.area_width) * 5 >= self.area_width * 4
+        self.column_band = column_band.astype(np.intp)
+        self.gap = in_gap
+        self.band_values = np.empty(self.area_width, np.float32)
+
+        # The waveform shows the min/max of two samples per column, zero-padded past the end of the mix
+        self.window = self.area_width * 2
+        self.window_buffer = np.zeros(self.window, np.float32)
+
+        self.titles = [(start, self._render_title(text, margin)) for start, text in titles]
+
+    def _render_title(self, text, margin):
+        """
+        The strip of background just above the visualizer area with a now-playing panel drawn on it,
+        as (slices, pixels)
+        """
+        font = load_font(30)
+        bottom = self.area[0].start - 12
+        rows = slice(max(bottom - 72, 0), bottom)
+        strip = Image.fromarray(self.background[rows])
+        overlay = Image.new("RGBA", strip.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(overlay)
+        label = f"Now playing: {text}"
+        max_chars = len(label)
+        while draw.textlength(label, font=font) > strip.size[0] - margin * 2 and max_chars > 20:
+            max_chars -= 4
+            label = textwrap.shorten(f"Now playing: {text}", max_chars, placeholder="...")
+        width = draw.textlength(label, font=font)
+        top = strip.size[1] - 58
+        draw.rounded_rectangle((margin - 18, top, margin + width + 18, top + 52), radius=14, fill=(0, 0, 0, 130))
+        draw.text((margin, top + 9), label, font=font, fill=(255, 255, 255, 235))
+        pixels = np.asarray(Image.alpha_composite(strip.convert("RGBA"), overlay).convert("RGB"))
+        return (rows, slice(0, pixels.shape[1])), pixels
+
+    def title_at(self, seconds):
+        current = None
+        for start, rendered in self.titles:
+            if start > seconds:
+                break
+            current = rendered
+        return current
+
+    def render(self, seconds, levels=None, samples=None):
+        """
+        Renders the frame at seconds from its band levels (spectrum) or the window of audio samples starting
+        at that time (waveform, self.window samples) and returns the shared frame buffer; it is overwritten
+        by the next call
+        """
+        np.copyto(self.frame, self.background)
+
+        if self.style == 'spectrum':
+            # Column thresholds: a column is lit from its band's bar top down to the bottom of the area
+            np.take(levels, self.column_band, out=self.band_values)
+            np.copyto(self.band_values, 0.0, where=self.gap)
+            np.multiply(self.band_values, -self.area_height, out=self.scaled)
+            np.add(self.scaled, self.area_height, out=self.scaled)
+            np.copyto(self.top, self.scaled, casting='unsafe')
+            np.greater_equal(self.rows, self.top, out=self.mask)
+        else:
+            # Min/max envelope of the samples under each column, centered vertically
+            if len(samples) < self.window:
+                self.window_buffer.fill(0.0)
+                self.window_buffer[:len(samples)] = samples
+                samples = self.window_buffer
+            columns = samples[:self.window].reshape(self.area_width, 2)
+            np.min(columns, axis=1, out=self.low)
+            np.max(columns, axis=1, out=self.high)
+            half = self.area_height / 2
+            np.multiply(self.high, -half, out=self.scaled)
+            np.add(self.scaled, half - 1, out=self.scaled)
+            np.copyto(self.top, self.scaled, casting='unsafe')
+            np.multiply(self.low, -half, out=self.scaled)
+            np.add(self.scaled, half + 1, out=self.scaled)
+            np.copyto(self.bottom, self.scaled, casting='unsafe')
+            np.greater_equal(self.rows, self.top, out=self.mask)
+            np.less_equal(self.rows, self.bottom, out=self.below)
+            np.logical_and(self.mask, self.below, out=self.mask)
+
+        np.copyto(self.frame[self.area], self.lit, where=self.mask[:, :, None])
+
+        title = self.title_at(seconds)
+        if title is not None:
+            slices, pixels = title
+            np.copyto(self.frame[slices], pixels)
+        return self.frame
+
+def load_background(image_path, size=FRAME_SIZE):
+    """
+    The background scaled and center-cropped to size, as an RGB array
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        scale = max(size[0] / image.width, size[1] / image.height)
+        resized = image.resize((round(image.width * scale), round(image.height * scale)), Image.BILINEAR)
+    left, top = (resized.width - size[0]) // 2, (resized.height - size[1]) // 2
+    return np.asarray(resized.crop((left, top, left + size[0], top + size[1])))
+
+def render_segment(job):
+    """
+    Renders frames [first, last) and encodes them to a video-only H.264 segment (runs in a worker process).
+    Levels and samples are memory-mapped, so each worker only touches its own part of the mix.
+    """
+    size, fps = job['size'], job['fps']
+    renderer = FrameRenderer(load_background(job['image_path'], size), job['style'], titles=job['titles'])
+    levels = np.load(job['levels_path'], mmap_mode='r') if job['style'] == 'spectrum' else None
+    samples = np.memmap(job['analysis_path'], dtype=np.float32, mode='r') if job['style'] == 'waveform' else None
+
+    command = [
+        get_ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "pipe:0",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+        "-g", str(fps * 2), "-threads", str(job['threads']), job['output_path']
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for index in range(job['first'], job['last']):
+            seconds = index / fps
+            if samples is not None:
+                start = int(seconds * ANALYSIS_RATE)
+                frame = renderer.render(seconds, samples=samples[start:start + renderer.window])
+            else:
+                frame = renderer.render(seconds, levels=levels[index])
+            process.stdin.write(memoryview(frame).cast('B'))
+        process.stdin.close()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg exited with code {process.returncode}: {stderr.decode(errors='replace').strip()}")
+    return job['last'] - job['first']
+
+def encode_visualized_video(audio_path, analysis_path, image_path, timestamps, output_video_path, style='spectrum',
+                            fps=FRAME_RATE, size=FRAME_SIZE, workers=None, segments_per_worker=2):
+    """
+    Renders an audio-reactive video: spectrum bars or a waveform over the background image,
+    with the now-playing title switching at each of the mix's timestamps.
+    The mix's analysis copy (mono float32 at ANALYSIS_RATE, see open_visualizer_sink) is transformed
+    in one vectorized pass, the frame range is split into segments rendered and encoded in parallel
+    worker processes, and the segments are joined with the already-encoded audio without re-encoding either.
+    Returns the number of frames rendered.
+    """
+    workers = workers or os.cpu_count() or 1
+    samples = np.memmap(analysis_path, dtype=np.float32, mode='r')
+    frames = int(len(samples) * fps / ANALYSIS_RATE)
+    if frames == 0:
+        raise ValueError(f"No audio to visualize in {analysis_path}")
+
+    work_folder = tempfile.mkdtemp(prefix="visualizer_", dir=os.path.dirname(os.path.abspath(output_video_path)))
+    try:
+        levels_path = os.path.join(work_folder, "levels.npy")
+        if style == 'spectrum':
+            np.save(levels_path, band_energies(samples, fps=fps))
+        del samples
+
+        count = min(workers * segments_per_worker, frames)
+        bounds = [frames * i // count for i in range(count + 1)]
+        titles = [(parse_timestamp(entry['timestamp']), entry['title']) for entry in timestamps]
+        jobs = [{
+            'first': first, 'last': last, 'size': size, 'fps': fps, 'style': style, 'titles': titles,
+            'image_path': image_path, 'levels_path': levels_path, 'analysis_path': analysis_path,
+            'threads': max(1, (os.cpu_count() or 1) // workers),
+            'output_path': os.path.join(work_folder, f"segment_{i:04d}.mp4")
+        } for i, (first, last) in enumerate(zip(bounds, bounds[1:]))]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = sum(executor.map(render_segment, jobs))
+
+        list_path = os.path.join(work_folder, "segments.txt")
+        with open(list_path, 'w') as f:
+            f.writelines(f"file '{job['output_path']}'\n" for job in jobs)
+        result = subprocess.run([
+            get_ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path, "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0", "-c", "copy", "-shortest", "-movflags", "+faststart",
+            output_video_path
+        ], stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+    return rendered
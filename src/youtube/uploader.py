@@ -1,24 +1,40 @@
 import os
+import json
+import time
+import random
+import datetime
+import threading
+import httplib2
+import google_auth_httplib2
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, build_http
 from google.auth.transport.requests import Request
 from ..config import (
     YOUTUBE_SCOPES,
     YOUTUBE_API_NAME,
     YOUTUBE_API_VERSION,
     CLIENT_SECRETS_FILE,
-    TOKEN_FILE,
-    anthropic_client
+    TOKEN_FILE
 )
+from ..utils.clients import get_anthropic_client
+from ..utils.metrics import get_metrics
 
-def generate_video_metadata(timestamps):
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+RETRIABLE_STATUS_CODES = {500, 502, 503, 504}
+RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, ConnectionError, TimeoutError)
+# What the server answers for a resumable session it no longer knows, after which the upload starts over
+EXPIRED_SESSION_STATUS_CODES = {404, 410}
+
+def draft_video_metadata(genre="lofi jazz"):
     """
-    Generates YouTube video title and description with timestamps
+    Generates YouTube video title and a description containing a [TIMESTAMPS] placeholder.
+    Needs nothing from the mix, so it can run while the songs are still generating.
     """
-    prompt = """
-    Create a YouTube video title and description for a lofi jazz music mix. The video contains multiple original AI-generated lofi jazz songs.
+    prompt = f"""
+    Create a YouTube video title and description for a {genre} music mix. The video contains multiple original AI-generated {genre} songs.
 
     Requirements:
     1. Title should be catchy and SEO-friendly (max 100 characters)
@@ -34,7 +50,7 @@ def generate_video_metadata(timestamps):
     [your description here]
     """
     
-    response = anthropic_client.messages.create(
+    response = get_anthropic_client().messages.create(
         model="claude-3-sonnet-20240229",
         max_tokens=1024,
         messages=[{
@@ -50,6 +66,12 @@ def generate_video_metadata(timestamps):
     description_start = content.find("DESCRIPTION:") + len("DESCRIPTION:")
     description = content[description_start:].strip()
     
+    return title, description
+
+def insert_timestamps(description, timestamps):
+    """
+    Fills the [TIMESTAMPS] placeholder of a drafted description and appends the project link
+    """
     timestamp_text = "\nTIMESTAMPS:\n"
     for ts in timestamps:
         timestamp_text += f"{ts['timestamp']} - {ts['title']}\n"
@@ -60,11 +82,164 @@ def generate_video_metadata(timestamps):
     github_link = "\n\n🔗 Check out the code behind this project: https://github.com/Bentlybro/Automated-Youtube-Music-Generation"
     description += github_link
     
-    return title, description
+    return description
+
+def generate_video_metadata(timestamps, genre="lofi jazz"):
+    """
+    Generates YouTube video title and description with timestamps
+    """
+    title, description = draft_video_metadata(genre)
+    return title, insert_timestamps(description, timestamps)
+
+class UploadStats:
+    """
+    Progress and throughput of a single upload
+    """
+    def __init__(self, total_bytes, start_offset=0):
+        self.total_bytes = total_bytes
+        self.start_offset = start_offset
+        self.bytes_uploaded = start_offset
+        self.retries = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def bytes_per_second(self):
+        return (self.bytes_uploaded - self.start_offset) / max(self.elapsed, 1e-9)
+
+    def as_dict(self):
+        return {
+            'total_bytes': self.total_bytes,
+            'bytes_uploaded': self.bytes_uploaded,
+            'elapsed': self.elapsed,
+            'bytes_per_second': self.bytes_per_second,
+            'retries': self.retries
+        }
+
+def _session_path(video_path):
+    return f"{video_path}.upload.json"
+
+def _file_signature(video_path):
+    stat = os.stat(video_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def load_upload_session(video_path):
+    """
+    Returns the resumable session URI saved by an interrupted upload of this exact file, if any
+    """
+    try:
+        with open(_session_path(video_path), 'r') as f:
+            session = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if session.get('file') != _file_signature(video_path):
+        return None
+    return session.get('uri')
+
+def save_upload_session(video_path, uri):
+    with open(_session_path(video_path), 'w') as f:
+        json.dump({'uri': uri, 'file': _file_signature(video_path)}, f)
+
+def clear_upload_session(video_path):
+    try:
+        os.remove(_session_path(video_path))
+    except FileNotFoundError:
+        pass
+
+def query_upload_status(http, session_uri, total_bytes):
+    """
+    Asks the server how much of a resumable upload it already has, with an empty PUT carrying
+    Content-Range: bytes */total_bytes. Returns (bytes_received, response), where response is the API
+    response if the upload had already completed. Raises HttpError otherwise (404 or 410 for an expired session).
+    """
+    resp, content = http.request(session_uri, method="PUT", body=b"",
+                                 headers={'Content-Range': f"bytes */{total_bytes}", 'Content-Length': "0"})
+    if resp.status in (200, 201):
+        return total_bytes, json.loads(content)
+    if resp.status == 308:
+        # Range is "bytes=0-<last byte received>", and absent when nothing has arrived yet
+        received = resp.get('range')
+        return (int(received.rsplit('-', 1)[1]) + 1 if received else 0), None
+    raise HttpError(resp, content, uri=session_uri)
 
-def upload_to_youtube(video_path, title, description):
+def run_resumable_upload(upload_request, video_path, max_retries=10, on_progress=None, http=None):
     """
-    Uploads video to YouTube as private
+    Drives a resumable upload chunk by chunk, retrying transient failures with exponential backoff.
+    http, if given, is the connection used for every chunk (see YouTubeUploader.authorized_http).
+    The session URI is saved next to the video so a crashed process can pick the upload up mid-file;
+    a saved session the server has expired is discarded and the upload starts over in a new one.
+    Returns the API response and the UploadStats of the upload.
+    """
+    http = http or upload_request.http
+    stats = UploadStats(os.path.getsize(video_path))
+    session_uri = load_upload_session(video_path)
+    check_status = bool(session_uri)
+    if check_status:
+        print("Resuming interrupted upload session...")
+        upload_request.resumable_uri = session_uri
+
+    response = None
+    retry = 0
+    while response is None:
+        error = None
+        try:
+            if check_status:
+                # Ask how many bytes the server already has before sending more
+                received, response = query_upload_status(http, session_uri, stats.total_bytes)
+                upload_request.resumable_progress = received
+                # Bytes sent by the previous process don't count towards this process's throughput
+                stats.start_offset = stats.bytes_uploaded = received
+                check_status = False
+                continue
+            status, response = upload_request.next_chunk(http=http)
+            if upload_request.resumable_uri and upload_request.resumable_uri != session_uri:
+                session_uri = upload_request.resumable_uri
+                save_upload_session(video_path, session_uri)
+            if status:
+                stats.bytes_uploaded = status.resumable_progress
+                print(f"Uploaded {status.progress() * 100:.1f}% "
+                      f"({stats.bytes_per_second / 1024 / 1024:.2f} MiB/s)")
+                if on_progress:
+                    on_progress(stats)
+            retry = 0
+        except HttpError as e:
+            if session_uri and (e.resp.status in EXPIRED_SESSION_STATUS_CODES
+                                or (check_status and 400 <= e.resp.status < 500)):
+                error = f"Upload session is no longer valid (HTTP {e.resp.status}), starting a new one"
+                clear_upload_session(video_path)
+                upload_request.resumable_uri = None
+                upload_request.resumable_progress = 0
+                session_uri = None
+                check_status = False
+                stats.start_offset = stats.bytes_uploaded = 0
+            elif e.resp.status not in RETRIABLE_STATUS_CODES:
+                raise
+            else:
+                error = f"Retriable HTTP error {e.resp.status}"
+        except RETRIABLE_EXCEPTIONS as e:
+            error = f"Retriable error: {e}"
+
+        if error:
+            retry += 1
+            stats.retries += 1
+            if retry > max_retries:
+                raise RuntimeError(f"Upload failed after {max_retries} retries: {error}")
+            delay = min(2 ** retry, 64) * random.uniform(0.5, 1.0)
+            print(f"{error}, retrying in {delay:.1f}s ({retry}/{max_retries})")
+            time.sleep(delay)
+
+    stats.bytes_uploaded = stats.total_bytes
+    if on_progress:
+        on_progress(stats)
+    clear_upload_session(video_path)
+    return response, stats
+
+def load_credentials():
+    """
+    Loads the saved OAuth token, refreshing it or running the consent flow when needed
     """
     credentials = None
     
@@ -85,39 +260,132 @@ def upload_to_youtube(video_path, title, description):
         with open(TOKEN_FILE, 'w') as token:
             token.write(credentials.to_json())
     
-    youtube = build(YOUTUBE_API_NAME, YOUTUBE_API_VERSION, credentials=credentials)
-    
-    body = {
-        'snippet': {
-            'title': title,
-            'description': description,
-            'tags': ['lofi', 'jazz', 'music', 'study music', 'AI generated'],
-            'categoryId': '10'  # Music category
-        },
-        'status': {
-            'privacyStatus': 'private',
-            'selfDeclaredMadeForKids': False
-        }
-    }
-    
-    try:
-        media = MediaFileUpload(
-            video_path,
-            mimetype='video/mp4',
-            resumable=True
-        )
-        
-        upload_request = youtube.videos().insert(
-            part=','.join(body.keys()),
-            body=body,
-            media_body=media
+    return credentials
+
+class YouTubeUploader:
+    """
+    Long-lived YouTube client that is safe to share between concurrent uploads.
+    Credentials are loaded once and refreshed in the background refresh_margin seconds before they expire,
+    the service is built once from the discovery document bundled with google-api-python-client,
+    and each upload runs over its own authorized HTTP connection since httplib2 is not thread-safe.
+    """
+    def __init__(self, credentials=None, api_endpoint=None, refresh_margin=300):
+        self.lock = threading.Lock()
+        self.refresh_margin = refresh_margin
+        self.credentials = credentials or load_credentials()
+        client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+        self.service = build(
+            YOUTUBE_API_NAME, YOUTUBE_API_VERSION, credentials=self.credentials,
+            static_discovery=True, client_options=client_options
         )
+        self.refresh_timer = None
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if not self.credentials.expiry or not self.credentials.refresh_token:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        delay = max((self.credentials.expiry - now).total_seconds() - self.refresh_margin, 0)
+        self.refresh_timer = threading.Timer(delay, self._refresh)
+        self.refresh_timer.daemon = True
+        self.refresh_timer.start()
+
+    def _refresh(self):
+        try:
+            with self.lock:
+                self.credentials.refresh(Request())
+                with open(TOKEN_FILE, 'w') as token:
+                    token.write(self.credentials.to_json())
+        except Exception as e:
+            print(f"Background token refresh failed: {e}")
+            # Try again shortly rather than waiting for the next expiry
+            self.refresh_timer = threading.Timer(60, self._refresh)
+            self.refresh_timer.daemon = True
+            self.refresh_timer.start()
+            return
+        self._schedule_refresh()
+
+    def authorized_http(self):
+        """
+        A fresh authorized connection for one upload. build_http keeps httplib2 from treating the
+        308 "resume incomplete" responses of a resumable upload as redirects.
+        """
+        return google_auth_httplib2.AuthorizedHttp(self.credentials, http=build_http())
+
+    def upload(self, video_path, title, description, chunk_size=UPLOAD_CHUNK_SIZE, max_retries=10, on_progress=None):
+        """
+        Uploads video to YouTube as private, in chunks of chunk_size bytes that are retried individually.
+        on_progress receives UploadStats after every chunk. Returns the video ID, or None on failure.
+        """
+        body = {
+            'snippet': {
+                'title': title,
+                'description': description,
+                'tags': ['lofi', 'jazz', 'music', 'study music', 'AI generated'],
+                'categoryId': '10'  # Music category
+            },
+            'status': {
+                'privacyStatus': 'private',
+                'selfDeclaredMadeForKids': False
+            }
+        }
         
-        response = upload_request.execute()
-        print(f"Upload successful! Video ID: {response['id']}")
-        print(f"Video URL: https://youtube.com/watch?v={response['id']}")
-        return response['id']
-        
+        try:
+            media = MediaFileUpload(
+                video_path,
+                mimetype='video/mp4',
+                chunksize=chunk_size,
+                resumable=True
+            )
+            
+            with self.lock:
+                upload_request = self.service.videos().insert(
+                    part=','.join(body.keys()),
+                    body=body,
+                    media_body=media
+                )
+            
+            response, stats = run_resumable_upload(
+                upload_request, video_path, max_retries, on_progress, http=self.authorized_http()
+            )
+            print(f"Upload successful! Video ID: {response['id']}")
+            print(f"Uploaded {stats.total_bytes / 1024 / 1024:.1f} MiB in {stats.elapsed:.1f}s "
+                  f"({stats.bytes_per_second / 1024 / 1024:.2f} MiB/s, {stats.retries} retries)")
+            print(f"Video URL: https://youtube.com/watch?v={response['id']}")
+            metrics = get_metrics()
+            metrics.observe('upload_bytes_per_second', stats.bytes_per_second)
+            metrics.increment('upload_retries', stats.retries)
+            return response['id']
+            
+        except Exception as e:
+            print(f"An error occurred during upload: {e}")
+            return None
+
+    def close(self):
+        if self.refresh_timer:
+            self.refresh_timer.cancel()
+
+_uploaders = {}
+_uploaders_lock = threading.Lock()
+
+def get_uploader(api_endpoint=None):
+    """
+    Returns the process-wide uploader for api_endpoint, creating it on first use
+    """
+    with _uploaders_lock:
+        if api_endpoint not in _uploaders:
+            _uploaders[api_endpoint] = YouTubeUploader(api_endpoint=api_endpoint)
+        return _uploaders[api_endpoint]
+
+def upload_to_youtube(video_path, title, description, chunk_size=UPLOAD_CHUNK_SIZE, max_retries=10,
+                      api_endpoint=None, on_progress=None):
+    """
+    Uploads video to YouTube as private through the shared uploader, so credentials and the
+    service are only set up once per process.
+    """
+    try:
+        uploader = get_uploader(api_endpoint)
     except Exception as e:
         print(f"An error occurred during upload: {e}")
-        return None
\ No newline at end of file
+        return None
+    return uploader.upload(video_path, title, description, chunk_size, max_retries, on_progress)